@@ -0,0 +1,360 @@
+'''
+WARC-style record/replay archive of fetched pages.
+
+While recording, every page the scraper fetches is appended to a single archive file.
+Each page is its own gzip member holding a short WARC-like header followed by the raw
+body, so any record can be decompressed on its own. A JSON index next to the archive
+(<archive>.idx) maps every URL to the offset and length of its record, which lets the
+replay reader jump straight to a page through a memory map without reading the rest
+of the file.
+
+The archive can also be served over HTTP by a small stand-in server so that the whole
+pipeline, including the fetch layer, runs offline against a frozen snapshot:
+
+    python src/archive.py serve data/catalog.warc.gz --port 8000
+    python src/scrape.py --mirror http://127.0.0.1:8000
+
+With --flaky, the server fails a share of the requests the way an overloaded server
+does (503 with Retry-After, 500, a dropped connection, or a body cut short of its
+Content-Length), to exercise the retries of the fetch layer.
+'''
+
+
+import argparse
+from datetime import datetime, timezone
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import mmap
+import os
+import random
+import threading
+from urllib.parse import urlsplit
+import zlib
+
+
+def index_path(archive_path):
+    """Return the path of the offset index belonging to an archive
+
+    Input: string. Path of the archive
+    Output: string. Path of the index
+    """
+
+    return archive_path + '.idx'
+
+
+def _encode_record(an_url, body, content_type):
+    header = ['WARC/1.0',
+              'WARC-Type: response',
+              f'WARC-Target-URI: {an_url}',
+              f'WARC-Date: {datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}',
+              f'Content-Type: {content_type}',
+              f'Content-Length: {len(body)}']
+    record = ('\r\n'.join(header) + '\r\n\r\n').encode('utf-8') + body + b'\r\n\r\n'
+
+    return gzip.compress(record)
+
+
+def _decode_record(record):
+    data = gzip.decompress(record)
+    head, _, rest = data.partition(b'\r\n\r\n')
+
+    fields = {}
+    for line in head.decode('utf-8').split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        fields[name.strip()] = value.strip()
+    length = int(fields['Content-Length'])
+
+    return fields, rest[:length]
+
+
+class ArchiveWriter:
+    """Append fetched pages to an archive and keep its offset index up to date. Every
+    record is flushed as it is written and the index is saved every `index_every`
+    records, so a run that dies before close() loses no page (see load_index).
+
+    Input: string. Path of the archive; an existing archive is appended to
+    """
+
+    index_every = 50
+
+    def __init__(self, path):
+        self.path = path
+        self.index = load_index(path) if os.path.exists(path) else {}
+        self._file = open(path, 'ab')
+        # Drop a record cut short by a run that died while writing it
+        self._file.truncate(max((offset + length for offset, length in self.index.values()),
+                                default=0))
+        self._file.seek(0, os.SEEK_END)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+    def write(self, an_url, body, content_type='text/html'):
+        """Append one page to the archive
+
+        Input:  string. URL of the page
+                bytes. Raw contents of the page
+                string. Content type of the page
+        Output: None
+        """
+
+        record = _encode_record(an_url, body, content_type)
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(record)
+            self._file.flush()
+            self.index[an_url] = [offset, len(record)]
+            self._unsaved += 1
+            if self._unsaved >= self.index_every:
+                self._save_index()
+
+    def close(self):
+        """Flush the archive and write its index. Closing twice does no harm.
+
+        Input: None
+        Output: None
+        """
+
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                self._save_index()
+
+    def _save_index(self):
+        # Replace the index atomically, so that a reader never sees half of it
+        path = index_path(self.path)
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=0)
+        os.replace(f'{path}.tmp', path)
+        self._unsaved = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveReader:
+    """Random access to the pages of an archive through a memory map
+
+    Input: string. Path of the archive
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = load_index(path)
+        self._file = open(path, 'rb')
+        if os.path.getsize(path):
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = b''
+
+    def __contains__(self, an_url):
+        return an_url in self.index
+
+    def urls(self):
+        """List the URLs stored in the archive
+
+        Input: None
+        Output: list. URLs in the order they were recorded
+        """
+
+        return sorted(self.index, key=lambda url: self.index[url][0])
+
+    def record(self, an_url):
+        """Read the header fields and body of an archived page
+
+        Input: string. URL
+        Output: tuple. A dict of header fields and the body bytes
+        """
+
+        if an_url not in self.index:
+            raise KeyError(f'{an_url} is not in the archive {self.path}')
+        offset, length = self.index[an_url]
+
+        return _decode_record(self._map[offset:offset + length])
+
+    def get(self, an_url):
+        """Read the body of an archived page
+
+        Input: string. URL
+        Output: bytes. Raw contents of the page
+        """
+
+        return self.record(an_url)[1]
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+def load_index(archive_path):
+    """Load the offset index of an archive, rebuilding it from the archive itself if
+    the index file is missing. Records appended after the index was last saved (by
+    a run that stopped before closing the archive) are recovered from the archive.
+
+    Input: string. Path of the archive
+    Output: dict. URL -> [offset, length] of its record
+    """
+
+    try:
+        with open(index_path(archive_path), encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return rebuild_index(archive_path)
+
+    end = max((offset + length for offset, length in index.values()), default=0)
+    if os.path.getsize(archive_path) > end:
+        index.update(rebuild_index(archive_path, end))
+
+    return index
+
+
+def rebuild_index(archive_path, start=0):
+    """Scan an archive member by member and recover the offset of every record. A
+    record cut short at the end of the archive is left out.
+
+    Input:  string. Path of the archive
+            int. Offset of the first record to scan
+    Output: dict. URL -> [offset, length] of its record
+    """
+
+    with open(archive_path, 'rb') as f:
+        f.seek(start)
+        data = f.read()
+
+    index = {}
+    offset = 0
+    while offset < len(data):
+        inflater = zlib.decompressobj(wbits=31)
+        try:
+            record = inflater.decompress(data[offset:])
+        except zlib.error:
+            break
+        if not inflater.eof:
+            break
+        length = len(data) - offset - len(inflater.unused_data)
+        head = record.partition(b'\r\n\r\n')[0].decode('utf-8')
+        for line in head.split('\r\n'):
+            if line.startswith('WARC-Target-URI:'):
+                index[line.partition(':')[2].strip()] = [start + offset, length]
+        offset += length
+
+    return index
+
+
+def mirror_path(an_url):
+    """Map a URL to the path it is served under by the stand-in server
+
+    Input: string. URL, e.g. https://ge.ucmerced.edu/intellectual-experience-badges
+    Output: string. Path, e.g. /ge.ucmerced.edu/intellectual-experience-badges
+    """
+
+    parts = urlsplit(an_url)
+    path = f'/{parts.netloc}{parts.path or "/"}'
+
+    return f'{path}?{parts.query}' if parts.query else path
+
+
+class _ArchiveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        reader = self.server.reader
+        target = self.path.lstrip('/')
+        record = next((reader.record(scheme + target) for scheme in ('https://', 'http://')
+                       if scheme + target in reader), None)
+
+        if self.server.flaky and self._fail(record):
+            return
+
+        if record is not None:
+            fields, body = record
+            self.send_response(200)
+            self.send_header('Content-Type', fields.get('Content-Type', 'text/html'))
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _fail(self, record):
+        # Fail the request with a probability of server.flaky; returns whether it did
+        with self.server.random_lock:
+            draw, failure = self.server.random.random(), self.server.random.randrange(4)
+        if draw >= self.server.flaky:
+            return False
+
+        if failure == 0:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+        elif failure == 1:
+            self.send_response(500)
+        elif failure == 2 or record is None:
+            self.close_connection = True
+            return True
+        else:
+            # Announce the whole page but send only half of it
+            fields, body = record
+            self.send_response(200)
+            self.send_header('Content-Type', fields.get('Content-Type', 'text/html'))
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return True
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+        return True
+
+    def log_message(self, *args):
+        pass
+
+
+def make_server(archive_path, host='127.0.0.1', port=8000, flaky=0.0, seed=None):
+    """Create a stand-in HTTP server serving the pages of an archive. A page recorded
+    as https://host/path?query is served under /host/path?query.
+
+    Input:  string. Path of the archive
+            string. Interface to listen on
+            int. Port to listen on (0 picks a free port)
+            float. Share of the requests to fail, between 0 and 1
+            int. Seed of the failures, for repeatable runs
+    Output: ThreadingHTTPServer. Call serve_forever() to start serving
+    """
+
+    server = ThreadingHTTPServer((host, port), _ArchiveHandler)
+    server.reader = ArchiveReader(archive_path)
+    server.flaky = flaky
+    server.random = random.Random(seed)
+    server.random_lock = threading.Lock()
+
+    return server
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Inspect or serve a page archive.')
+    parser.add_argument('command', choices=['list', 'serve'])
+    parser.add_argument('archive')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--flaky', type=float, default=0.0, metavar='SHARE',
+                        help='fail this share of the requests, e.g. 0.2 (serve only)')
+    parser.add_argument('--seed', type=int, help='seed of the --flaky failures')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        reader = ArchiveReader(args.archive)
+        for url in reader.urls():
+            print(reader.index[url][1], url)
+    else:
+        server = make_server(args.archive, args.host, args.port, args.flaky, args.seed)
+        print(f'Serving {args.archive} on http://{args.host}:{server.server_port}')
+        server.serve_forever()
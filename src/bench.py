@@ -0,0 +1,656 @@
+'''
+Benchmarks for the scraper, run against pages saved in a page archive (see archive.py)
+so that the timings do not depend on the network:
+
+    python src/scrape.py --record data/catalog.warc.gz
+    python src/bench.py parsers data/catalog.warc.gz
+    python src/bench.py strainer data/catalog.warc.gz
+    python src/bench.py fastpath data/catalog.warc.gz
+    python src/bench.py export data/catalog.warc.gz --scale 1000
+    python src/bench.py serve data/catalog.warc.gz --requests 20000 --concurrency 64
+    python src/bench.py optimize data/catalog.warc.gz --top 5
+
+The suite command runs every stage of the scraper on the HTML fixtures checked in under
+data/fixtures, fetched from a local stand-in server, and compares the time, peak
+memory and output of each stage with the baselines stored in
+data/fixtures/baseline.json:
+
+    python src/bench.py suite
+    python src/bench.py suite --update-baseline
+
+Peak memory and outputs are deterministic and fail the suite as soon as they exceed
+the tolerance. Wall-clock times vary with the machine and its load by more than
+that, so a stage slower than the tolerance is only reported ('slower'); the suite
+fails on time only past the much wider time gate ('SLOWER', 2x by default).
+'''
+
+
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from urllib.parse import quote
+
+from bs4 import Tag
+import pandas as pd
+
+from archive import ArchiveReader, ArchiveWriter, make_server
+from course import parse_course
+import export
+import fastpath
+import fetch as fetch_layer
+import optimize
+import parsers
+from pipeline import digest
+import query
+import scrape
+import synth
+
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'data', 'fixtures')
+
+
+def load_pages(archive_path):
+    """Read the catalog and badge pages out of a page archive
+
+    Input: string. Path of the archive
+    Output: tuple. A list of catalog pages and a list of badge pages (raw bytes)
+    """
+
+    reader = ArchiveReader(archive_path)
+    catalog_pages, badge_pages = [], []
+    for url in reader.urls():
+        page = reader.get(url)
+        if 'preview_program.php' in url:
+            catalog_pages.append(page)
+        elif b'content-col2-1' in page:
+            badge_pages.append(page)
+    reader.close()
+
+    return catalog_pages, badge_pages
+
+
+def best_of(func, repeat=5):
+    """Time a function, keeping the fastest of several runs
+
+    Input:  function. Called without arguments
+            int. Number of runs
+    Output: float. Seconds taken by the fastest run
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def peak_memory(func):
+    """Measure the peak memory allocated while a function runs
+
+    Input: function. Called without arguments
+    Output: int. Peak traced allocation in bytes
+    """
+
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_parsers(catalog_pages, badge_pages, repeat=5):
+    """Compare the parse time of every installed parser backend and check that each
+    one extracts exactly the same GE and badge courses
+
+    Input:  list. Catalog pages (raw bytes)
+            list. Badge pages (raw bytes)
+            int. Number of timed runs per backend
+    Output: bool. True if every backend produced identical results
+    """
+
+    backends = [name for name in ('html.parser', 'lxml', 'html5lib')
+                if parsers.available(name)]
+
+    reference = None
+    identical = True
+    print(f'{"backend":<12} {"catalog (ms)":>14} {"badges (ms)":>14}  output')
+    for name in backends:
+        parsers.set_parser(name)
+        catalog_time = best_of(
+            lambda: [parsers.make_soup(page) for page in catalog_pages], repeat)
+        badge_time = best_of(
+            lambda: [parsers.make_soup(page) for page in badge_pages], repeat)
+
+        result = ([scrape.extract_ges(parsers.make_soup(page)) for page in catalog_pages],
+                  scrape.extract_badges([parsers.make_soup(page) for page in badge_pages]))
+        if reference is None:
+            reference = result
+        same = repr(result) == repr(reference)
+        identical = identical and same
+
+        print(f'{name:<12} {catalog_time * 1000:>14.2f} {badge_time * 1000:>14.2f}  '
+              f'{"identical" if same else "DIFFERENT"}')
+
+    parsers.set_parser('auto')
+
+    return identical
+
+
+def bench_strainer(catalog_pages, badge_pages, repeat=5):
+    """Compare building the full tree of each page with parsing only the subtrees
+    declared in scrape.ge_targets and scrape.badge_targets
+
+    Input:  list. Catalog pages (raw bytes)
+            list. Badge pages (raw bytes)
+            int. Number of timed runs per mode
+    Output: bool. True if both modes produced identical results
+    """
+
+    modes = [('full tree', None, None),
+             ('strained', scrape.ge_targets, scrape.badge_targets)]
+
+    reference = None
+    identical = True
+    print(f'backend: {parsers.parser}')
+    print(f'{"mode":<10} {"catalog (ms)":>13} {"peak (KiB)":>11} '
+          f'{"badges (ms)":>12} {"peak (KiB)":>11}  output')
+    for mode, ge_targets, badge_targets in modes:
+        def parse_catalog():
+            return [parsers.make_soup(page, ge_targets) for page in catalog_pages]
+
+        def parse_badges():
+            return [parsers.make_soup(page, badge_targets) for page in badge_pages]
+
+        result = ([scrape.extract_ges(soup) for soup in parse_catalog()],
+                  scrape.extract_badges(parse_badges()))
+        if reference is None:
+            reference = result
+        same = repr(result) == repr(reference)
+        identical = identical and same
+
+        print(f'{mode:<10} {best_of(parse_catalog, repeat) * 1000:>13.2f} '
+              f'{peak_memory(parse_catalog) / 1024:>11.0f} '
+              f'{best_of(parse_badges, repeat) * 1000:>12.2f} '
+              f'{peak_memory(parse_badges) / 1024:>11.0f}  '
+              f'{"identical" if same else "DIFFERENT"}')
+
+    return identical
+
+
+def bench_fastpath(catalog_pages, badge_pages, repeat=5):
+    """Compare the BeautifulSoup extraction with the zero-DOM fast path and check that
+    both return identical dicts
+
+    Input:  list. Catalog pages (raw bytes)
+            list. Badge pages (raw bytes)
+            int. Number of timed runs per mode
+    Output: bool. True if both modes produced identical results
+    """
+
+    def soup_path():
+        return ([scrape.extract_ges(parsers.make_soup(page, scrape.ge_targets))
+                 for page in catalog_pages],
+                scrape.extract_badges([parsers.make_soup(page, scrape.badge_targets)
+                                       for page in badge_pages]))
+
+    def fast_path():
+        return ([scrape.extract_ges_fast(page) for page in catalog_pages],
+                scrape.extract_badges_fast(badge_pages))
+
+    scanned = ([fastpath.scan_ges(page) for page in catalog_pages]
+               + [fastpath.scan_badge(page) for page in badge_pages])
+    print(f'backend: {parsers.parser}; pages the scanner could not read: '
+          f'{sum(1 for result in scanned if result is None)}')
+
+    identical = repr(fast_path()) == repr(soup_path())
+    for mode, func in (('soup', soup_path), ('fast path', fast_path)):
+        print(f'{mode:<10} {best_of(func, repeat) * 1000:>10.2f} ms')
+    print('output identical' if identical else 'output DIFFERENT')
+
+    return identical
+
+
+# Run in a fresh interpreter that imports nothing but the export module, so that the
+# peak RSS only reflects writing one format. VmHWM is used where available because
+# ru_maxrss keeps the high-water mark of the parent process across fork and exec.
+_EXPORT_ONE = """
+import json, pickle, resource, sys, time
+import export
+
+def peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+with open(sys.argv[1], 'rb') as f:
+    tables = pickle.load(f)
+rss_before = peak_rss()
+start = time.perf_counter()
+export.export(tables, sys.argv[3], [sys.argv[2]])
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'rss_before': rss_before, 'rss_peak': peak_rss()}))
+"""
+
+
+def bench_export(catalog_pages, badge_pages, formats=None, scale=1):
+    """Time every export format and measure its peak resident memory. Each format is
+    written by a separate process so that the peaks do not mask each other.
+
+    Input:  list. Catalog pages (raw bytes)
+            list. Badge pages (raw bytes)
+            list. Formats to benchmark (defaults to all of them)
+            int. Repeat every column this many times to simulate a larger catalog
+    Output: bool. True if every format was written
+    """
+
+    tables = scrape.cross_reference(scrape.extract_ges_fast(catalog_pages[0]),
+                                    scrape.extract_badges_fast(badge_pages))
+    tables = {sheet: {name: values * scale for name, values in table.items()}
+              for sheet, table in tables.items()}
+    rows = sum(max(map(len, table.values()), default=0) for table in tables.values())
+
+    ok = True
+    print(f'{len(tables)} tables, {rows} rows')
+    print(f'{"format":<8} {"time (ms)":>10} {"peak RSS (MiB)":>15} {"added (MiB)":>12}')
+    with tempfile.TemporaryDirectory() as tmp:
+        tables_path = os.path.join(tmp, 'tables.pickle')
+        with open(tables_path, 'wb') as f:
+            pickle.dump(tables, f)
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+
+        for fmt in formats or export.output_formats:
+            proc = subprocess.run(
+                [sys.executable, '-c', _EXPORT_ONE, tables_path, fmt,
+                 os.path.join(tmp, fmt)], capture_output=True, text=True, env=env)
+            if proc.returncode != 0:
+                ok = False
+                print(f'{fmt:<8} failed: {proc.stderr.strip().splitlines()[-1]}')
+                continue
+            result = json.loads(proc.stdout)
+            print(f'{fmt:<8} {result["seconds"] * 1000:>10.1f} '
+                  f'{result["rss_peak"] / 1024:>15.1f} '
+                  f'{(result["rss_peak"] - result["rss_before"]) / 1024:>12.1f}')
+
+    return ok
+
+
+def _lookup_paths(index):
+    # A mix of simple and composite lookups covering every endpoint of serve.py
+    paths = [f'/courses/{quote(code)}' for code in index['courses']]
+    paths += [f'/badges/{quote(badge)}' for badge in index['badges']]
+    paths += [f'/overlap?area={quote(area)}&badge={quote(badge)}'
+              for area in index['areas'] for badge in index['badges']]
+    paths += [f'/groups/{quote(group)}' for group in index['groups']]
+
+    return paths + ['/badges', '/areas', '/health']
+
+
+async def _load(host, port, paths, requests, concurrency):
+    latencies, failures = [], 0
+
+    async def client(worker):
+        nonlocal failures
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in range(worker, requests, concurrency):
+            start = time.perf_counter()
+            writer.write(f'GET {paths[i % len(paths)]} HTTP/1.1\r\n'
+                         f'Host: {host}\r\n\r\n'.encode('latin-1'))
+            status = (await reader.readline()).split()[1]
+            length = 0
+            while (line := await reader.readline()) not in (b'\r\n', b''):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            failures += status != b'200'
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(worker) for worker in range(concurrency)))
+
+    return time.perf_counter() - start, sorted(latencies), failures
+
+
+def bench_serve(catalog_pages, badge_pages, requests=10000, concurrency=32):
+    """Load test the lookup service: start serve.py on an index of the archived
+    catalog and send it a mix of lookups over keep-alive connections
+
+    Input:  list. Catalog pages (raw bytes)
+            list. Badge pages (raw bytes)
+            int. Number of requests
+            int. Number of connections sending requests at the same time
+    Output: bool. True if every request succeeded
+    """
+
+    badges = scrape.extract_badges_fast(badge_pages)
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = query.write_index(scrape.extract_ges_fast(catalog_pages[0]), badges,
+                                       os.path.join(tmp, 'index.json'),
+                                       groups=scrape.group_courses(badges))
+        paths = _lookup_paths(query.load_index(index_path))
+
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                          'serve.py'),
+             '--index', index_path, '--port', '0', '--reload-interval', '0'],
+            stdout=subprocess.PIPE, text=True)
+        try:
+            address = server.stdout.readline().split('http://')[1].strip()
+            host, port = address.rsplit(':', 1)
+            seconds, latencies, failures = asyncio.run(
+                _load(host, int(port), paths, requests, concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    print(f'{requests} requests over {concurrency} connections '
+          f'({len(paths)} distinct lookups)')
+    print(f'{requests / seconds:.0f} requests/s, latency p50 {percentile(50):.2f} ms, '
+          f'p99 {percentile(99):.2f} ms, max {latencies[-1] * 1000:.2f} ms')
+    if failures:
+        print(f'{failures} requests failed')
+
+    return failures == 0
+
+
+def _cover_groups(ges, badges):
+    return {group: [course.code for course in courses]
+            for group, courses in {**ges, **badges}.items()}
+
+
+def bench_optimize(catalog_pages, badge_pages, repeat=5, top=5):
+    """Time the course set optimizer on the archived catalog, exactly and greedily,
+    then on synthetic catalogs too large to solve exactly
+
+    Input:  list. Catalog pages (raw bytes)
+            list. Badge pages (raw bytes)
+            int. Number of runs of every measurement on the archived catalog
+            int. Number of plans
+    Output: bool. True if the exact search finished on the archived catalog
+    """
+
+    groups = _cover_groups(scrape.extract_ges_fast(catalog_pages[0]),
+                           scrape.extract_badges_fast(badge_pages))
+    problems = [('archive', groups, repeat)]
+    for courses, areas, badges in ((2000, 20, 30), (20000, 200, 100)):
+        history, badge_classes = synth.make_catalog(courses, areas, badges)
+        ges = {area: list(map(parse_course, listings))
+               for area, listings in history[max(history)].items()}
+        problems.append((f'synth {courses}/{areas}/{badges}',
+                         _cover_groups(ges, {badge: list(map(parse_course, listings))
+                                             for badge, listings in badge_classes.items()}),
+                         1))
+
+    ok = True
+    print(f'{"catalog":<20} {"groups":>6} {"courses":>7} {"method":<7} {"plans":>5} '
+          f'{"time (ms)":>10} {"cost":>5}  optimal')
+    for label, groups, runs in problems:
+        courses = len({code for codes in groups.values() for code in codes})
+        for method, k in (('exact', 1), ('exact', top), ('greedy', top), ('auto', top)):
+            if method == 'exact' and label != 'archive':
+                continue
+            result = optimize.cover(groups, k=k, method=method)
+            seconds = best_of(lambda: optimize.cover(groups, k=k, method=method), runs)
+            cost = result['plans'][0]['cost'] if result['plans'] else '-'
+            print(f'{label:<20} {len(groups):>6} {courses:>7} {method:<7} {k:>5} '
+                  f'{seconds * 1000:>10.1f} {cost:>5}  {result["optimal"]}')
+            if label == 'archive' and method == 'exact':
+                ok &= result['optimal']
+
+    return ok
+
+
+def fixture_archive(directory, path):
+    """Pack the HTML fixtures listed in a fixture manifest into a page archive
+
+    Input:  string. Directory holding the fixtures and their manifest.json, which maps
+                every URL to the file of its page
+            string. Path of the archive
+    Output: string. Path of the archive
+    """
+
+    with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    with ArchiveWriter(path) as writer:
+        for url, name in manifest.items():
+            with open(os.path.join(directory, name), 'rb') as f:
+                writer.write(url, f.read())
+
+    return path
+
+
+def _fingerprint(value):
+    # A digest of a stage output, to notice when a change alters what a stage returns
+    if isinstance(value, (list, tuple)):
+        return digest(*map(_fingerprint, value))
+    if isinstance(value, dict):
+        return digest(*(digest(repr(key), _fingerprint(item)) for key, item in value.items()))
+    if isinstance(value, pd.DataFrame):
+        return digest(value.to_json())
+    if isinstance(value, Tag):              # BeautifulSoup tree
+        return digest(str(value))
+    return digest(repr(value))
+
+
+def suite_stages(tmp):
+    """List the stages of the scraper measured by the suite, each one fed with the
+    output of the stages before it
+
+    Input: string. Directory the export stage writes to
+    Output: list. (stage name, function called without arguments, whether its output
+        is fingerprinted) tuples in pipeline order
+    """
+
+    ge_soup = scrape.scrape_parse(scrape.ge_url, scrape.ge_targets)
+    badge_soups = scrape.badge_links(scrape.badge_url, targets=scrape.badge_targets)
+    ge_page = fetch_layer.fetch(scrape.ge_url)
+    badge_pages = list(scrape.badge_pages(scrape.badge_url).values())
+    ges = scrape.extract_ges(ge_soup)
+    badges = scrape.extract_badges(badge_soups)
+    index = scrape.course_index(ges, badges)
+    matrix = scrape.badge_matrix(badges, index)
+    tables = scrape.cross_reference(ges, badges)
+
+    return [
+        ('scrape_parse', lambda: scrape.scrape_parse(scrape.ge_url, scrape.ge_targets), True),
+        ('badge_links', lambda: scrape.badge_links(scrape.badge_url,
+                                                   targets=scrape.badge_targets), True),
+        ('extract_ges', lambda: scrape.extract_ges(ge_soup), True),
+        ('extract_badges', lambda: scrape.extract_badges(badge_soups), True),
+        ('extract_ges_fast', lambda: scrape.extract_ges_fast(ge_page), True),
+        ('extract_badges_fast', lambda: scrape.extract_badges_fast(badge_pages), True),
+        ('in_or_not', lambda: scrape.in_or_not(ges, badges), True),
+        ('stem', lambda: scrape.stem(badges), True),
+        ('xref', lambda: [scrape.xref({area: courses}, badges, matrix)
+                          for area, courses in ges.items()], True),
+        ('cross_reference', lambda: scrape.cross_reference(ges, badges), True),
+        ('create_dfs', lambda: [scrape.create_dfs(table) for table in tables.values()],
+         True),
+        ('export_xlsx', lambda: export.write_xlsx(tables, os.path.join(tmp, 'suite.xlsx')),
+         False),
+    ]
+
+
+def run_suite(directory=fixtures_dir, repeat=5):
+    """Run every stage on the fixtures, fetching them from a local stand-in server
+
+    Input:  string. Directory of the fixtures
+            int. Number of timed runs per stage
+    Output: dict. Stage names as keys and {'seconds', 'peak_bytes', 'output'} as values
+    """
+
+    saved = (fetch_layer.cache, fetch_layer.recorder, fetch_layer.replay,
+             fetch_layer.mirror)
+    with tempfile.TemporaryDirectory() as tmp:
+        server = make_server(fixture_archive(directory, os.path.join(tmp, 'fixtures.warc.gz')),
+                             port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        fetch_layer.set_cache(None)
+        fetch_layer.set_archive(a_mirror=f'http://127.0.0.1:{server.server_port}')
+
+        results = {}
+        try:
+            for name, func, fingerprinted in suite_stages(tmp):
+                results[name] = {'seconds': best_of(func, repeat),
+                                 'peak_bytes': peak_memory(func),
+                                 'output': _fingerprint(func()) if fingerprinted else None}
+        finally:
+            server.shutdown()
+            server.server_close()
+            server.reader.close()
+            fetch_layer.set_cache(saved[0])
+            fetch_layer.set_archive(*saved[1:])
+
+    return results
+
+
+def compare_suite(results, baseline, tolerance=0.25, time_gate=1.0):
+    """Print the suite results next to the baselines and flag regressions: a stage
+    using more memory than its baseline by more than the tolerance (and by more than
+    64 KiB, below which differences are noise), slower than its baseline by more than
+    the time gate (and by more than 0.5 ms), or a stage whose output changed. A stage
+    slower by more than the tolerance only is reported without failing the suite.
+
+    Input:  dict. Results of run_suite()
+            dict. Baseline file contents, or None
+            float. Allowed relative increase of peak memory; larger relative increases
+                of time are reported
+            float. Allowed relative increase of time
+    Output: bool. True if no stage regressed
+    """
+
+    stages = (baseline or {}).get('stages', {})
+    if baseline and baseline.get('machine') != _machine():
+        print(f"baseline recorded on {baseline.get('machine')}; timings may not compare")
+
+    ok = True
+    print(f'{"stage":<20} {"time (ms)":>10} {"base":>8} {"peak (KiB)":>11} {"base":>8}  status')
+    for name, result in results.items():
+        base = stages.get(name)
+        status, notes = [], []
+        if base is None:
+            notes.append('no baseline')
+        else:
+            if result['seconds'] - base['seconds'] > 0.0005:
+                if result['seconds'] > base['seconds'] * (1 + time_gate):
+                    status.append('SLOWER')
+                elif result['seconds'] > base['seconds'] * (1 + tolerance):
+                    notes.append('slower')
+            if (result['peak_bytes'] > base['peak_bytes'] * (1 + tolerance)
+                    and result['peak_bytes'] - base['peak_bytes'] > 64 * 1024):
+                status.append('MORE MEMORY')
+            if result['output'] != base.get('output'):
+                status.append('OUTPUT CHANGED')
+            ok = ok and not status
+        print(f'{name:<20} {result["seconds"] * 1000:>10.2f} '
+              f'{base["seconds"] * 1000 if base else float("nan"):>8.2f} '
+              f'{result["peak_bytes"] / 1024:>11.0f} '
+              f'{base["peak_bytes"] / 1024 if base else float("nan"):>8.0f}  '
+              f'{", ".join(status + notes) or "ok"}')
+
+    return ok
+
+
+def _machine():
+    return f'{platform.machine()} {platform.python_implementation()} {platform.python_version()}'
+
+
+def write_baseline(results, path, repeat):
+    """Store suite results as the new baselines
+
+    Input:  dict. Results of run_suite()
+            string. Path of the baseline file
+            int. Number of timed runs per stage the results were measured with
+    Output: None
+    """
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'machine': _machine(), 'parser': parsers.parser, 'repeat': repeat,
+                   'stages': results}, f, indent=2)
+        f.write('\n')
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Benchmark the scraper.')
+    parser.add_argument('command', choices=['parsers', 'strainer', 'fastpath', 'export',
+                                            'serve', 'optimize', 'suite'])
+    parser.add_argument('archive', nargs='?',
+                        help='page archive recorded with scrape.py --record (not used by '
+                             'suite)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--format', action='append', choices=export.output_formats,
+                        help='export format to benchmark (default: all)')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='repeat every exported column this many times')
+    parser.add_argument('--top', type=int, default=5,
+                        help='number of plans of the course set optimizer')
+    parser.add_argument('--requests', type=int, default=10000,
+                        help='number of requests sent to the lookup service')
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='number of connections to the lookup service')
+    parser.add_argument('--fixtures', default=fixtures_dir,
+                        help='directory of the suite fixtures')
+    parser.add_argument('--baseline',
+                        help='baseline file of the suite (default: <FIXTURES>/baseline.json)')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store the suite results as the new baselines')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative memory growth failing the suite, and relative '
+                             'slowdown reported')
+    parser.add_argument('--time-gate', type=float, default=1.0,
+                        help='relative slowdown failing the suite (default 1.0, i.e. '
+                             'twice as slow)')
+    args = parser.parse_args()
+
+    if args.command == 'suite':
+        baseline_path = args.baseline or os.path.join(args.fixtures, 'baseline.json')
+        results = run_suite(args.fixtures, args.repeat)
+        baseline = None
+        if os.path.exists(baseline_path) and not args.update_baseline:
+            with open(baseline_path, encoding='utf-8') as f:
+                baseline = json.load(f)
+        ok = compare_suite(results, baseline, args.tolerance, args.time_gate)
+        if args.update_baseline:
+            write_baseline(results, baseline_path, args.repeat)
+            print(f'baselines written to {baseline_path}')
+        sys.exit(0 if ok else 1)
+    if args.archive is None:
+        parser.error(f'{args.command} needs an archive')
+
+    catalog_pages, badge_pages = load_pages(args.archive)
+    if args.command == 'parsers':
+        ok = bench_parsers(catalog_pages, badge_pages, args.repeat)
+    elif args.command == 'strainer':
+        ok = bench_strainer(catalog_pages, badge_pages, args.repeat)
+    elif args.command == 'fastpath':
+        ok = bench_fastpath(catalog_pages, badge_pages, args.repeat)
+    elif args.command == 'export':
+        ok = bench_export(catalog_pages, badge_pages, args.format, args.scale)
+    elif args.command == 'serve':
+        ok = bench_serve(catalog_pages, badge_pages, args.requests, args.concurrency)
+    elif args.command == 'optimize':
+        ok = bench_optimize(catalog_pages, badge_pages, args.repeat, args.top)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,162 @@
+'''
+Disk-backed HTTP response cache.
+
+Each cached URL is stored as two files named after a hash of the URL: the raw body
+and a small JSON record of its validators (ETag / Last-Modified) and timestamps. The
+fetch layer uses the validators to send conditional GETs, so pages that have not
+changed since the last run come back as an empty 304 and are served from disk. Every
+lookup touches the record, so that eviction drops the least recently used pages.
+'''
+
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a URL has never been cached"""
+
+
+class DiskCache:
+    """Response cache keyed by URL
+
+    Input:  string. Directory holding the cached responses
+            float. Seconds a cached page is used without revalidating it (0 = always
+                revalidate)
+            bool. Offline mode; never touch the network and serve whatever is cached
+            int. Maximum total size in bytes of the cached bodies before the least
+                recently used pages are evicted
+    """
+
+    def __init__(self, directory, max_age=0, offline=False, max_bytes=50 * 2**20):
+        self.directory = directory
+        self.max_age = max_age
+        self.offline = offline
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, an_url):
+        key = hashlib.sha256(an_url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.body', base + '.json'
+
+    def get(self, an_url):
+        """Look up a cached response
+
+        Input: string. URL
+        Output: tuple. The metadata dict and the body bytes, or None if not cached
+        """
+
+        body_path, meta_path = self._paths(an_url)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+            # The modification time of the record is the last use of the page
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+
+        return meta, body
+
+    def is_fresh(self, meta):
+        """Check whether a cached response can be used without asking the server
+
+        Input: dict. Metadata of a cached response
+        Output: bool
+        """
+
+        return self.offline or time.time() - meta['validated'] < self.max_age
+
+    def validators(self, meta):
+        """Build the headers of a conditional GET for a cached response
+
+        Input: dict. Metadata of a cached response
+        Output: dict. Request headers
+        """
+
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        return headers
+
+    def store(self, an_url, body, headers):
+        """Save a response body and its validators, then evict old pages if the cache
+        has grown past its size limit
+
+        Input:  string. URL
+                bytes. Response body
+                dict. Response headers
+        Output: None
+        """
+
+        now = time.time()
+        meta = {'url': an_url,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'size': len(body),
+                'stored': now,
+                'validated': now}
+
+        body_path, meta_path = self._paths(an_url)
+        with self._lock:
+            _write_atomic(body_path, body)
+            _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+            self._evict()
+
+    def revalidated(self, an_url, meta, headers):
+        """Record that the server answered 304 Not Modified for a cached page
+
+        Input:  string. URL
+                dict. Metadata of the cached response
+                dict. Headers of the 304 response
+        Output: None
+        """
+
+        meta = dict(meta)
+        meta['validated'] = time.time()
+        meta['etag'] = headers.get('ETag', meta.get('etag'))
+        meta['last_modified'] = headers.get('Last-Modified', meta.get('last_modified'))
+
+        with self._lock:
+            _write_atomic(self._paths(an_url)[1], json.dumps(meta).encode('utf-8'))
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            try:
+                with open(meta_path, encoding='utf-8') as f:
+                    meta = json.load(f)
+                used = os.stat(meta_path).st_mtime
+            except (OSError, ValueError):
+                continue
+            entries.append((used, meta['size'], meta_path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, meta_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (meta_path, meta_path[:-len('.json')] + '.body'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,97 @@
+'''
+Compact course records.
+
+The catalog and badge pages list courses as strings such as
+"SPAN 050: Introduction to Hispanic\xa0Literatures", often with superfluous characters
+("/a", "/as", "\xa0", tabs). parse_course() cleans and splits such a string in a single
+pass into a Course holding the department, number and title. Courses are interned by
+their code and title, so a course listed on several pages is stored once. The intern
+table only holds weak references, so a course no longer used by any catalog is freed
+(e.g. after a lookup index is reloaded). Two listings of the same course compare
+equal even if their titles are spelled differently (e.g. in two catalog years), but
+each keeps its own spelling.
+'''
+
+
+import re
+import weakref
+
+
+# Superfluous characters removed (or, for non-breaking spaces, replaced) while parsing
+_NOISE = re.compile('/as?|\t|\xa0')
+_COURSE = re.compile(r'\s*([A-Z]{2,5})\s*(\d{1,3}[A-Z]{0,2})\s*:\s*(.*?)\s*$', re.S)
+
+# Weak references to the course records in use, by (department, number, title). A
+# plain dict of weakrefs is looked up faster than a WeakValueDictionary.
+_courses = {}
+
+
+class Course:
+    """A course identified by its department and number, e.g. SPAN 050"""
+
+    __slots__ = ('dept', 'number', 'title', 'code', '__weakref__')
+
+    def __init__(self, dept, number, title):
+        self.dept = dept
+        self.number = number
+        self.title = title
+        self.code = f'{dept} {number}'
+
+    def __str__(self):
+        return f'{self.code}: {self.title}'
+
+    def __repr__(self):
+        return f'Course({str(self)!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, Course):
+            return NotImplemented
+        return self.code == other.code
+
+    def __lt__(self, other):
+        return (self.dept, self.number) < (other.dept, other.number)
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __reduce__(self):
+        return parse_course, (str(self),)
+
+
+def _clean(match):
+    return ' ' if match.group() == '\xa0' else ''
+
+
+def parse_course(text):
+    """Parse a course listing into a Course, reusing the existing record if the same
+    course code and title were seen before
+
+    Input: string. Course listing, e.g. "CCST 060: Introduction to Chicano/a Culture"
+    Output: Course. The course record, or None if the text is not a course listing
+    """
+
+    if isinstance(text, Course):
+        return text
+
+    match = _COURSE.match(_NOISE.sub(_clean, text))
+    if match is None:
+        return None
+
+    dept, number, title = match.groups()
+    key = (dept, number, title)
+    ref = _courses.get(key)
+    course = ref() if ref is not None else None
+    if course is None:
+        course = Course(dept, number, title)
+        ref = _courses.setdefault(key, weakref.ref(course, _forget(key)))
+        course = ref() or course
+
+    return course
+
+
+def _forget(key):
+    # Callback removing the entry of a freed course, unless the key was reused since
+    def forget(ref):
+        if _courses.get(key) is ref:
+            _courses.pop(key, None)
+    return forget
@@ -0,0 +1,189 @@
+'''
+Frontier-based crawler over the shared fetch layer.
+
+Starting from one or more seed pages, the crawler follows the links of every page it
+fetches, breadth first, up to a maximum depth:
+
+  - every link is resolved against its page and canonicalized (see canonicalize), so
+    'HTTPS://Host:443/a/?b=1&a=2#top' and 'https://host/a?a=2&b=1' are the same page;
+  - a seen-set keeps every page from being fetched twice, including the seeds;
+  - only links matching one of the include patterns, and none of the exclude
+    patterns, are followed;
+  - each level of the crawl is fetched concurrently through fetch_all, and the
+    frontier is bounded by the maximum number of pages.
+
+Pages come back in the order they were discovered, which does not depend on the
+order in which the fetches finish, so a crawl of the same pages always gives the same
+result. Link extraction scans the raw page with a pattern rather than building a
+BeautifulSoup tree.
+
+    python src/crawl.py https://ge.ucmerced.edu/intellectual-experience-badges \\
+        --include '^https://ge\\.ucmerced\\.edu/intellectual-experience-badges/[^/]+$'
+'''
+
+
+import argparse
+import html
+import re
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import fetch as fetch_layer
+from fetch import fetch_all
+
+
+_default_ports = {'http': 80, 'https': 443}
+
+_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_ANCHOR_HREF = re.compile(
+    r'<a\s[^>]*?\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))', re.I)
+_SLASHES = re.compile(r'/{2,}')
+
+
+def canonicalize(an_url, base=None):
+    """Normalize a URL so that equivalent links compare equal: resolve it against the
+    page it was found on, lowercase the scheme and host, drop the default port, the
+    fragment and any trailing slash, and sort the query parameters
+
+    Input:  string. URL or link, possibly relative; None for an anchor without href
+            string. URL of the page the link was found on
+    Output: string. Canonical URL, or None if the link does not point to a web page
+        (e.g. mailto: or javascript:)
+    """
+
+    if an_url is None or not an_url.strip():
+        return None
+
+    an_url = an_url.strip()
+    if base is not None:
+        an_url = urljoin(base, an_url)
+
+    parts = urlsplit(an_url)
+    scheme = parts.scheme.lower()
+    if scheme not in _default_ports or not parts.hostname:
+        return None
+    try:
+        port = parts.port
+    except ValueError:
+        return None
+
+    netloc = parts.hostname.lower()
+    if port is not None and port != _default_ports[scheme]:
+        netloc = f'{netloc}:{port}'
+    path = _SLASHES.sub('/', parts.path)
+    path = path.rstrip('/') or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def links(content, base):
+    """List the distinct pages a page links to
+
+    Input:  bytes. Raw contents of the page
+            string. URL of the page
+    Output: list. Canonical URLs, in the order of their first link on the page
+    """
+
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+
+    found = {}
+    for match in _ANCHOR_HREF.finditer(_COMMENT.sub('', content)):
+        href = html.unescape(next(group for group in match.groups() if group is not None))
+        an_url = canonicalize(href, base)
+        if an_url is not None:
+            found.setdefault(an_url, None)
+
+    return list(found)
+
+
+def _patterns(patterns):
+    return [re.compile(pattern) if isinstance(pattern, str) else pattern
+            for pattern in patterns]
+
+
+def crawl(seeds, include=(), exclude=(), max_depth=1, max_pages=None, workers=None,
+          skip_failed=False):
+    """Fetch seed pages and, breadth first, the pages they link to
+
+    Input:  list. URLs of the seed pages, always fetched
+            list. Regular expressions (strings or compiled); a link is followed only if
+                it matches one of them. Every link is followed if empty
+            list. Regular expressions; a link matching one of them is never followed
+            int. Number of links to follow from a seed, e.g. 1 for the pages the seeds
+                link to
+            int. Maximum number of pages fetched, seeds included; no limit if None
+            int. Number of pages fetched at the same time (defaults to
+                fetch.max_workers)
+            bool. Leave out linked pages that cannot be fetched (they are listed in
+                fetch.failed) instead of raising FetchError. Seeds always raise
+    Output: list. (URL, depth, raw contents) of every page fetched, in the order they
+        were discovered; seeds have depth 0
+    """
+
+    include, exclude = _patterns(include), _patterns(exclude)
+
+    def follow(an_url):
+        return ((not include or any(pattern.search(an_url) for pattern in include))
+                and not any(pattern.search(an_url) for pattern in exclude))
+
+    frontier = []
+    for seed in seeds:
+        seed = canonicalize(seed)
+        if seed is not None and seed not in frontier:
+            frontier.append(seed)
+    seen = set(frontier)
+    if max_pages is not None:
+        frontier = frontier[:max_pages]
+
+    pages = []
+    for depth in range(max_depth + 1):
+        if not frontier:
+            break
+        contents = fetch_all(frontier, workers, skip_failed and depth > 0)
+
+        level = [(an_url, depth, content)
+                 for an_url, content in zip(frontier, contents) if content is not None]
+        pages += level
+        if depth == max_depth:
+            break
+
+        # The next level, bounded by the pages left to fetch
+        frontier = []
+        room = None if max_pages is None else max_pages - len(seen)
+        for an_url, _, content in level:
+            for link in links(content, an_url):
+                if room is not None and len(frontier) >= room:
+                    break
+                if link not in seen and follow(link):
+                    seen.add(link)
+                    frontier.append(link)
+
+    return pages
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Crawl pages from seed URLs and list the pages found.')
+    parser.add_argument('seeds', nargs='+', metavar='URL')
+    parser.add_argument('--include', action='append', default=[], metavar='REGEX',
+                        help='follow only links matching this pattern; may be repeated')
+    parser.add_argument('--exclude', action='append', default=[], metavar='REGEX',
+                        help='never follow links matching this pattern; may be repeated')
+    parser.add_argument('--depth', type=int, default=1,
+                        help='number of links to follow from a seed')
+    parser.add_argument('--max-pages', type=int, help='maximum number of pages fetched')
+    parser.add_argument('--workers', type=int, default=fetch_layer.max_workers,
+                        help='number of pages fetched at the same time')
+    parser.add_argument('--mirror', metavar='URL',
+                        help='fetch every page from a stand-in server (see archive.py)')
+    args = parser.parse_args()
+
+    fetch_layer.set_archive(a_mirror=args.mirror)
+    for an_url, depth, content in crawl(args.seeds, args.include, args.exclude,
+                                        args.depth, args.max_pages, args.workers,
+                                        skip_failed=True):
+        print(depth, len(content), an_url)
+    for an_url, reason in fetch_layer.failed:
+        print(f'failed: {an_url}: {reason}')
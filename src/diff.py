@@ -0,0 +1,207 @@
+'''
+Year-over-year diff of GE areas and badges.
+
+A catalog is the pair of dicts extract_ges and extract_badges produce (or that
+load_snapshot reads back). Each one is first reduced to its canonical form: for every
+GE area and badge, a frozenset of (course code, title) pairs. Two catalogs are then
+compared with set operations on the pairs of each group:
+
+    added    codes listed in the new catalog only
+    removed  codes listed in the old catalog only
+    renamed  codes listed in both, with a different title
+
+Canonical forms are computed once per catalog. Groups whose sets hash and compare
+equal are skipped, and the codes of the others are only looked at in the symmetric
+difference of the two sets, so diffing many years pairwise costs little more than the
+changes themselves.
+
+    python src/diff.py data/catalog-2019.arrow data/catalog-2020.arrow --json changes.json
+'''
+
+
+import argparse
+from itertools import combinations
+import json
+
+from course import parse_course
+
+
+# Kinds of groups in a catalog, in the order of the (ges, badges) pair
+kinds = ('area', 'badge')
+
+
+def canonical(groups):
+    """Reduce the groups of a catalog to sets of (course code, title) pairs
+
+    Input: dict. GE areas or badges as keys and lists of courses as values
+    Output: dict. Group names as keys and frozensets of (code, title) as values
+    """
+
+    result = {}
+    for group, courses in groups.items():
+        codes = {}
+        for course in map(parse_course, courses):
+            if course is not None:
+                codes.setdefault(course.code, course.title)
+        result[group] = frozenset(codes.items())
+
+    return result
+
+
+def diff_groups(old, new):
+    """Compare the groups of two catalogs
+
+    Input:  dict. Canonical groups of the old catalog, see canonical()
+            dict. Canonical groups of the new catalog
+    Output: dict. For every group with changes: {'added': [(code, title)],
+        'removed': [(code, title)], 'renamed': [(code, old title, new title)],
+        'status': 'added', 'removed' or 'changed'}; sorted by code
+    """
+
+    empty = frozenset()
+
+    changes = {}
+    for group in {**old, **new}:
+        before, after = old.get(group, empty), new.get(group, empty)
+        if group in old and group in new and hash(before) == hash(after) \
+                and before == after:
+            continue
+        # Only the pairs in the symmetric difference can be added, removed or renamed
+        before, after = dict(before - after), dict(after - before)
+        added = after.keys() - before.keys()
+        removed = before.keys() - after.keys()
+        renamed = [(code, before[code], after[code])
+                   for code in sorted(before.keys() & after.keys())]
+        if group not in old:
+            status = 'added'
+        elif group not in new:
+            status = 'removed'
+        elif added or removed or renamed:
+            status = 'changed'
+        else:
+            continue
+        changes[group] = {'status': status,
+                          'added': [(code, after[code]) for code in sorted(added)],
+                          'removed': [(code, before[code]) for code in sorted(removed)],
+                          'renamed': renamed}
+
+    return changes
+
+
+def diff_catalogs(old, new):
+    """Compare the GE areas and badges of two catalogs
+
+    Input:  tuple. GE dict and badge dict of the old catalog (as from extract_ges and
+                extract_badges, or load_snapshot), or their canonical forms
+            tuple. GE dict and badge dict of the new catalog
+    Output: dict. 'area' and 'badge' as keys and diff_groups() results as values
+    """
+
+    return {kind: diff_groups(_canonical(before), _canonical(after))
+            for kind, before, after in zip(kinds, old, new)}
+
+
+def _canonical(groups):
+    # Canonical forms map to frozensets; raw groups map to lists of courses
+    if all(isinstance(pairs, frozenset) for pairs in groups.values()):
+        return groups
+    return canonical(groups)
+
+
+def diff_history(catalogs, all_pairs=False):
+    """Compare catalogs of several years, each one against the year before or, with
+    all_pairs, every pair of years
+
+    Input:  dict. Labels (e.g. catalog years) as keys and (ges, badges) tuples as
+                values, in chronological order
+            bool. Compare every pair of catalogs rather than consecutive ones
+    Output: dict. (old label, new label) as keys and diff_catalogs() results as values
+    """
+
+    canonical_forms = {label: tuple(map(canonical, catalog))
+                       for label, catalog in catalogs.items()}
+    labels = list(canonical_forms)
+    pairs = combinations(labels, 2) if all_pairs else zip(labels, labels[1:])
+
+    return {(old, new): diff_catalogs(canonical_forms[old], canonical_forms[new])
+            for old, new in pairs}
+
+
+def changes_table(history):
+    """Flatten diff results into a table with one row per changed course
+
+    Input: dict. (old label, new label) as keys and diff_catalogs() results as values
+    Output: dict. Column names as keys and lists of values as values
+    """
+
+    table = {'From': [], 'To': [], 'Kind': [], 'Group': [], 'Change': [],
+             'Course': [], 'Old title': [], 'New title': []}
+
+    def add_row(old, new, kind, group, change, code, old_title='', new_title=''):
+        for name, value in zip(table, (old, new, kind, group, change, code,
+                                       old_title, new_title)):
+            table[name].append(value)
+
+    for (old, new), catalog_diff in history.items():
+        for kind, changes in catalog_diff.items():
+            for group, change in changes.items():
+                if change['status'] != 'changed':
+                    add_row(old, new, kind, group, f"{kind} {change['status']}", '')
+                for code, title in change['added']:
+                    add_row(old, new, kind, group, 'added', code, new_title=title)
+                for code, title in change['removed']:
+                    add_row(old, new, kind, group, 'removed', code, old_title=title)
+                for code, old_title, new_title in change['renamed']:
+                    add_row(old, new, kind, group, 'renamed', code, old_title, new_title)
+
+    return table
+
+
+def changes_json(history):
+    """Convert diff results to a JSON-serializable list, one entry per pair of
+    catalogs
+
+    Input: dict. (old label, new label) as keys and diff_catalogs() results as values
+    Output: list
+    """
+
+    return [{'from': old, 'to': new, **catalog_diff}
+            for (old, new), catalog_diff in history.items()]
+
+
+if __name__ == "__main__":
+
+    from snapshot import load_snapshot
+
+    parser = argparse.ArgumentParser(
+        description='List the courses added to, removed from or renamed in every GE '
+                    'area and badge between catalog snapshots.')
+    parser.add_argument('snapshots', nargs='+', metavar='SNAPSHOT',
+                        help='Arrow snapshots (see snapshot.py), oldest first')
+    parser.add_argument('--all-pairs', action='store_true',
+                        help='compare every pair of snapshots, not only consecutive ones')
+    parser.add_argument('--json', metavar='PATH',
+                        help='write the changes to a JSON file')
+    parser.add_argument('--output', metavar='PATH',
+                        help="write a 'Catalog Changes' sheet to <PATH>.xlsx")
+    args = parser.parse_args()
+    if len(args.snapshots) < 2:
+        parser.error('at least two snapshots are needed')
+
+    history = diff_history({path: load_snapshot(path) for path in args.snapshots},
+                           args.all_pairs)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(changes_json(history), f, indent=2, ensure_ascii=False)
+    if args.output:
+        from export import export
+        export({'Catalog Changes': changes_table(history)}, args.output)
+
+    for (old, new), catalog_diff in history.items():
+        print(f'{old} -> {new}')
+        for kind, changes in catalog_diff.items():
+            for group, change in changes.items():
+                print(f"  {kind} {group}: {change['status']}, "
+                      f"+{len(change['added'])} -{len(change['removed'])} "
+                      f"~{len(change['renamed'])}")
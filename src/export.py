@@ -0,0 +1,179 @@
+'''
+Export of the cross-reference tables.
+
+A table is a dict of columns (column name -> list of values), and the columns may have
+different lengths, like the dicts create_dfs turns into DataFrames. The writers below
+stream each table row by row instead of first materializing a NaN-padded DataFrame:
+the Excel workbook is written with xlsxwriter in constant-memory mode, and every table
+can also be written as CSV, JSON Lines or Parquet for tools that do not need the xlsx
+round trip.
+
+    export(tables, 'data/CrossReferenceGE-Badges', ['xlsx', 'csv', 'jsonl', 'parquet'])
+'''
+
+
+import csv
+from itertools import zip_longest
+import json
+import os
+
+import tracing
+
+
+# Formats export() can write
+output_formats = ['xlsx', 'csv', 'jsonl', 'parquet']
+
+
+def rows(table):
+    """Iterate over the rows of a table with ragged columns
+
+    Input: dict. Column names as keys and lists of values as values
+    Output: iterator. Tuples of (row number, list of values); missing values are None
+    """
+
+    return enumerate(zip_longest(*table.values(), fillvalue=None))
+
+
+def _value(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if hasattr(value, 'item'):      # numpy scalars
+        return value.item()
+    return str(value)
+
+
+def _file_name(sheet):
+    return sheet.replace(os.sep, '-').replace('/', '-')
+
+
+def write_xlsx(tables, path):
+    """Write tables to an Excel workbook, one sheet per table, laid out like
+    DataFrame.to_excel. Rows are streamed with xlsxwriter in constant-memory mode; if
+    xlsxwriter is not installed the tables go through pandas instead.
+
+    Input:  dict. Sheet names as keys and tables as values
+            string. Path of the workbook
+    Output: list. Paths written
+    """
+
+    try:
+        import xlsxwriter
+    except ImportError:
+        import pandas as pd
+        with pd.ExcelWriter(path) as writer:
+            for sheet, table in tables.items():
+                pd.DataFrame.from_dict(
+                    {key: pd.Series(value, dtype=object) for key, value in table.items()}
+                ).to_excel(writer, sheet_name=sheet)
+        return [path]
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    bold = workbook.add_format({'bold': True, 'border': 1, 'align': 'center',
+                                'valign': 'top'})
+    for sheet, table in tables.items():
+        worksheet = workbook.add_worksheet(sheet)
+        for col, name in enumerate(table, start=1):
+            worksheet.write(0, col, str(name), bold)
+        for idx, values in rows(table):
+            worksheet.write_number(idx + 1, 0, idx, bold)
+            for col, value in enumerate(values, start=1):
+                if value is not None:
+                    worksheet.write(idx + 1, col, _value(value))
+    workbook.close()
+
+    return [path]
+
+
+def write_csv(tables, directory):
+    """Write every table to its own CSV file
+
+    Input:  dict. Sheet names as keys and tables as values
+            string. Directory of the CSV files
+    Output: list. Paths written
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for sheet, table in tables.items():
+        path = os.path.join(directory, f'{_file_name(sheet)}.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['', *table])
+            for idx, values in rows(table):
+                writer.writerow([idx, *('' if value is None else _value(value)
+                                        for value in values)])
+        paths.append(path)
+
+    return paths
+
+
+def write_jsonl(tables, directory):
+    """Write every table to its own JSON Lines file, one object per row; missing values
+    of ragged columns are left out of the row
+
+    Input:  dict. Sheet names as keys and tables as values
+            string. Directory of the JSON Lines files
+    Output: list. Paths written
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for sheet, table in tables.items():
+        path = os.path.join(directory, f'{_file_name(sheet)}.jsonl')
+        names = [str(name) for name in table]
+        with open(path, 'w', encoding='utf-8') as f:
+            for _, values in rows(table):
+                record = {name: _value(value)
+                          for name, value in zip(names, values) if value is not None}
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        paths.append(path)
+
+    return paths
+
+
+def write_parquet(tables, directory):
+    """Write every table to its own Parquet file. Needs pyarrow.
+
+    Input:  dict. Sheet names as keys and tables as values
+            string. Directory of the Parquet files
+    Output: list. Paths written
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for sheet, table in tables.items():
+        length = max((len(values) for values in table.values()), default=0)
+        columns = {str(name): pa.array([_value(value) for value in values]
+                                       + [None] * (length - len(values)))
+                   for name, values in table.items()}
+        path = os.path.join(directory, f'{_file_name(sheet)}.parquet')
+        pq.write_table(pa.table(columns), path)
+        paths.append(path)
+
+    return paths
+
+
+def export(tables, base_path, formats=('xlsx',)):
+    """Write tables in every requested format
+
+    Input:  dict. Sheet names as keys and tables as values
+            string. Output path without extension; the workbook is written to
+                <base_path>.xlsx and the other formats to files in <base_path>/
+            list. Formats, any of 'xlsx', 'csv', 'jsonl' and 'parquet'
+    Output: list. Paths written
+    """
+
+    writers = {'csv': write_csv, 'jsonl': write_jsonl, 'parquet': write_parquet}
+
+    paths = []
+    for fmt in formats:
+        with tracing.span(f'write_{fmt}'):
+            if fmt == 'xlsx':
+                paths += write_xlsx(tables, f'{base_path}.xlsx')
+            else:
+                paths += writers[fmt](tables, base_path)
+
+    return paths
@@ -0,0 +1,162 @@
+'''
+Zero-DOM fast path for the page layouts the scraper knows about: the acalog program
+preview page (the GE courses, or the courses of any program) and the Drupal badge
+pages.
+
+Instead of building a BeautifulSoup tree, the raw page is scanned with a handful of
+compiled patterns for exactly the text extract_ges and extract_badges read from the
+tree: the course anchors, the first child of each 'acalog-core' block, the badge
+title and the text of the badge content block. The results are checked cheaply
+(anchor counts, course code shape) and callers fall back to BeautifulSoup whenever a
+check fails, so an unexpected layout costs a full parse rather than wrong output.
+'''
+
+
+import html
+import re
+
+from course import parse_course
+import tracing
+
+
+_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_TAG = re.compile(r'<[^>]*>')
+_COURSE_ANCHOR = re.compile(
+    r'<a\s[^>]*?\bhref\s*=\s*(["\'])#\1[^>]*>(.*?)</a\s*>', re.S | re.I)
+_ANY_HASH_ANCHOR = re.compile(r'<a\s[^>]*?\bhref\s*=\s*["\']?#(?=["\'\s>])', re.I)
+_CORE_BLOCK = re.compile(
+    r'<div\s[^>]*?\bclass\s*=\s*(["\'])(?:[^"\']*\s)?acalog-core(?:\s[^"\']*)?\1[^>]*>',
+    re.I)
+_FIRST_ELEMENT = re.compile(r'<([a-zA-Z][\w-]*)\b[^>]*>(.*?)</\1\s*>', re.S)
+_BADGE_TITLE = re.compile(
+    r'<h1\s[^>]*?\bclass\s*=\s*(["\'])(?:[^"\']*\s)?title(?:\s[^"\']*)?\1[^>]*>(.*?)</h1\s*>',
+    re.S | re.I)
+_CONTENT_BLOCK = re.compile(
+    r'<div\s[^>]*?\bid\s*=\s*(["\'])content-col2-1\1[^>]*>', re.I)
+_DIV_TAG = re.compile(r'<(/?)div\b[^>]*>', re.I)
+_PROGRAM_TITLE = re.compile(
+    r'<h1\s[^>]*?\bid\s*=\s*(["\'])acalog-content\1[^>]*>(.*?)</h1\s*>', re.S | re.I)
+
+
+def _decode(content):
+    if isinstance(content, str):
+        return content
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def text_of(fragment):
+    """Return the visible text of an HTML fragment, like BeautifulSoup's .text
+
+    Input: string. HTML fragment
+    Output: string
+    """
+
+    return html.unescape(_TAG.sub('', _COMMENT.sub('', fragment)))
+
+
+@tracing.traced('parse')
+def scan_ges(content):
+    """Scan a catalog program page for the course anchors and area headers
+
+    Input: bytes. Raw contents of the catalog page
+    Output: tuple. The text of every course anchor and the text of the first child of
+        every 'acalog-core' block, or None if the page does not look as expected
+    """
+
+    page = _decode(content)
+    if page is None:
+        return None
+    page = _COMMENT.sub('', page)
+
+    anchors = [text_of(match.group(2)) for match in _COURSE_ANCHOR.finditer(page)]
+    if not anchors or len(anchors) != len(_ANY_HASH_ANCHOR.findall(page)):
+        return None
+
+    headers = []
+    for match in _CORE_BLOCK.finditer(page):
+        rest = page[match.end():]
+        if not rest.startswith('<'):
+            headers.append(html.unescape(rest[:rest.find('<')]))
+            continue
+        element = _FIRST_ELEMENT.match(rest)
+        if element is None:
+            return None
+        headers.append(text_of(element.group(2)))
+    if len(headers) != page.count('acalog-core'):
+        return None
+
+    return anchors, headers
+
+
+@tracing.traced('parse')
+def scan_program(content):
+    """Scan a catalog program page for its title and course anchors
+
+    Input: bytes. Raw contents of the program page
+    Output: tuple. The title text and the text of every course anchor, or None if the
+        page does not look as expected
+    """
+
+    page = _decode(content)
+    if page is None:
+        return None
+    page = _COMMENT.sub('', page)
+
+    title = _PROGRAM_TITLE.search(page)
+    if title is None:
+        return None
+    anchors = [text_of(match.group(2)) for match in _COURSE_ANCHOR.finditer(page)]
+    if len(anchors) != len(_ANY_HASH_ANCHOR.findall(page)):
+        return None
+
+    return text_of(title.group(2)), anchors
+
+
+def _div_contents(page, start):
+    depth = 1
+    for match in _DIV_TAG.finditer(page, start):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return page[start:match.start()]
+
+    return None
+
+
+@tracing.traced('parse')
+def scan_badge(content):
+    """Scan a badge page for its title and the text of its course list
+
+    Input: bytes. Raw contents of a badge page
+    Output: tuple. The title text and the text of the 'content-col2-1' block, or None
+        if the page does not look as expected
+    """
+
+    page = _decode(content)
+    if page is None:
+        return None
+    page = _COMMENT.sub('', page)
+
+    title = _BADGE_TITLE.search(page)
+    block = _CONTENT_BLOCK.search(page)
+    if title is None or block is None:
+        return None
+
+    contents = _div_contents(page, block.end())
+    if contents is None:
+        return None
+
+    return text_of(title.group(2)), text_of(contents)
+
+
+def valid(texts):
+    """Cheap sanity check of scanned course names: there is at least one and every one
+    of them parses as a course listing such as 'ANTH 001: ...'
+
+    Input: list. Scanned course names
+    Output: bool
+    """
+
+    return bool(texts) and all(parse_course(text) is not None for text in texts)
@@ -0,0 +1,364 @@
+'''
+Shared fetch layer for the scraper.
+
+All pages are retrieved through a single pooled requests.Session so that connections
+to the catalog and badge websites are kept alive and reused instead of paying for a
+new TCP+TLS handshake on every page. Several pages can be fetched at once with a
+bounded pool of worker threads; results always come back in the order the URLs were
+given.
+
+Responses can optionally go through a DiskCache (see cache.py), in which case pages
+already on disk are revalidated with conditional GETs or, in offline mode, served
+without touching the network at all.
+
+Every fetched page can also be recorded into a page archive, or served from one
+instead of the network (see archive.py). A mirror base URL redirects all requests to
+the archive's stand-in server.
+
+Requests are scheduled politely: every request has a timeout, at most `per_host`
+requests (by default `max_workers`) go to the same host at once and, if `rate` is
+set, no more than `rate` requests per second. Timeouts, connection errors and 429/5xx
+responses are retried with exponential backoff and full jitter, waiting as long as a
+Retry-After header asks when there is one. A page that still cannot be fetched, or
+that is missing from the replayed archive or offline cache, raises FetchError (or,
+when the cache holds an older copy, that copy is served); fetch_all(skip_failed=True)
+instead returns None for it and notes it in `failed`, so that a run can finish and
+report the failed URLs at the end.
+'''
+
+
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from archive import mirror_path
+from cache import CacheMiss
+import tracing
+
+
+# Number of pages fetched at the same time. Also used as the size of the connection
+# pool kept open for each host.
+max_workers = 8
+
+# Optional DiskCache shared by every fetch. None disables caching.
+cache = None
+
+# Optional ArchiveWriter recording every fetched page, ArchiveReader serving pages
+# instead of the network, and base URL of a stand-in server to send requests to.
+recorder = None
+replay = None
+mirror = None
+
+# Seconds to wait for a server to connect or answer, number of retries of a failed
+# request, base and maximum delay in seconds between retries, requests sent to one
+# host at the same time (None for as many as the workers, so that a single-host run
+# is not throttled), and requests per second sent to one host (0 for no limit)
+timeout = 30
+retries = 3
+backoff = 0.5
+max_backoff = 30
+per_host = None
+rate = 0
+
+# Statuses and request errors worth retrying; a truncated or garbled body counts as
+# a failed request too
+retry_statuses = {429, 500, 502, 503, 504}
+retry_errors = (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ContentDecodingError)
+
+# (URL, reason) of every page fetch_all(skip_failed=True) could not fetch
+failed = []
+
+_session = None
+_session_lock = threading.Lock()
+_hosts = {}
+
+
+class FetchError(Exception):
+    """A page could not be fetched, even after retrying
+
+    Input:  string. URL
+            string. Reason of the last failure
+    """
+
+    def __init__(self, url, reason):
+        super().__init__(f'{url}: {reason}')
+        self.url = url
+        self.reason = reason
+
+
+class _Host:
+    # Concurrency and rate limit of the requests sent to one host
+
+    def __init__(self):
+        self.slots = threading.BoundedSemaphore(per_host or max_workers)
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait_turn(self):
+        if rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            turn = max(now, self.next_time)
+            self.next_time = turn + 1 / rate
+        if turn > now:
+            time.sleep(turn - now)
+
+
+def _host(an_url):
+    netloc = urlsplit(an_url).netloc
+    with _session_lock:
+        host = _hosts.get(netloc)
+        if host is None:
+            host = _hosts[netloc] = _Host()
+
+    return host
+
+
+def get_session():
+    """Return the shared requests session, creating it on first use
+
+    Input: None
+    Output: requests.Session. A session with a keep-alive connection pool
+    """
+
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers,
+                                  pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+
+    return _session
+
+
+def configure(workers=None, a_timeout=None, a_retries=None, a_backoff=None,
+              a_per_host=None, a_rate=None):
+    """Change fetch settings. The shared session is rebuilt on the next fetch so that
+    its connection pool matches the new number of workers.
+
+    Input:  int. Number of pages fetched at the same time
+            float. Seconds to wait for a server to connect or answer
+            int. Number of retries of a failed request
+            float. Base delay in seconds between retries
+            int. Number of requests sent to one host at the same time; by default
+                as many as the workers
+            float. Requests per second sent to one host, 0 for no limit
+    Output: None
+    """
+
+    global max_workers, timeout, retries, backoff, per_host, rate, _session
+
+    with _session_lock:
+        if workers is not None:
+            max_workers = max(1, int(workers))
+        if a_timeout is not None:
+            timeout = a_timeout
+        if a_retries is not None:
+            retries = max(0, int(a_retries))
+        if a_backoff is not None:
+            backoff = a_backoff
+        if a_per_host is not None:
+            per_host = max(1, int(a_per_host))
+        if a_rate is not None:
+            rate = a_rate
+        _hosts.clear()
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def set_cache(a_cache):
+    """Route every fetch through a response cache
+
+    Input: DiskCache. The cache to use, or None to disable caching
+    Output: None
+    """
+
+    global cache
+    cache = a_cache
+
+
+def set_archive(a_recorder=None, a_replay=None, a_mirror=None):
+    """Record fetched pages to an archive, replay them from one, or redirect requests
+    to a stand-in server
+
+    Input:  ArchiveWriter. Archive every fetched page is appended to
+            ArchiveReader. Archive pages are served from instead of the network
+            string. Base URL of a stand-in server, e.g. http://127.0.0.1:8000
+    Output: None
+    """
+
+    global recorder, replay, mirror
+    recorder, replay, mirror = a_recorder, a_replay, a_mirror
+
+
+def fetch(an_url):
+    """Retrieve the contents of a URL through the shared session. When a cache is set,
+    fresh pages are served from disk and stale ones are revalidated with a conditional
+    GET. A page that is missing from the replayed archive, or from the cache in
+    offline mode, cannot be fetched either.
+
+    Input: string. URL
+    Output: bytes. The raw contents of the page
+    """
+
+    started = time.perf_counter()
+    if replay is not None:
+        try:
+            content = replay.get(an_url)
+        except KeyError as e:
+            raise FetchError(an_url, 'not in the replayed archive') from e
+        tracing.fetched(an_url, 200, len(content), started, 'replay')
+        return content
+
+    try:
+        content, status, source = _download(an_url)
+    except CacheMiss as e:
+        raise FetchError(an_url, 'not in the cache (offline)') from e
+    tracing.fetched(an_url, status, len(content), started, source)
+    if recorder is not None:
+        recorder.write(an_url, content)
+
+    return content
+
+
+def retry_delay(attempt, response=None):
+    """Seconds to wait before retrying a request: what the Retry-After header of the
+    response asks for if it has one, otherwise an exponential backoff with full jitter
+
+    Input:  int. Number of the attempt that failed, starting at 0
+            requests.Response. The failed response, if any
+    Output: float
+    """
+
+    after = response.headers.get('Retry-After') if response is not None else None
+    if after:
+        try:
+            delay = float(after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0.0), max_backoff)
+
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+def _request(an_url, headers=None):
+    target = an_url if mirror is None else mirror.rstrip('/') + mirror_path(an_url)
+
+    host = _host(target)
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        response = None
+        with host.slots:
+            host.wait_turn()
+            try:
+                response = get_session().get(target, headers=headers, timeout=timeout)
+            except retry_errors as e:
+                reason = f'{type(e).__name__}: {e}'
+            except requests.RequestException as e:
+                # e.g. an invalid URL, which no retry can fix
+                raise FetchError(an_url, f'{type(e).__name__}: {e}') from e
+        if response is not None:
+            if response.status_code not in retry_statuses:
+                return response
+            reason = f'HTTP {response.status_code}'
+
+        tracing.fetched(an_url, response.status_code if response is not None else 0, 0,
+                        started, 'retry')
+        if attempt < retries:
+            time.sleep(retry_delay(attempt, response))
+
+    raise FetchError(an_url, reason)
+
+
+def _get(an_url, headers=None):
+    response = _request(an_url, headers)
+    if response.status_code != 304 and not response.ok:
+        raise FetchError(an_url, f'HTTP {response.status_code}')
+
+    return response
+
+
+def _download(an_url):
+    # Returns the page, the HTTP status and where the page came from
+    if cache is None:
+        response = _get(an_url)
+        return response.content, response.status_code, 'network'
+
+    entry = cache.get(an_url)
+    if entry is not None and cache.is_fresh(entry[0]):
+        return entry[1], 200, 'cache'
+    if cache.offline:
+        raise CacheMiss(an_url)
+
+    headers = cache.validators(entry[0]) if entry is not None else {}
+    try:
+        response = _get(an_url, headers)
+    except FetchError:
+        # Serve the stale copy rather than nothing
+        if entry is None:
+            raise
+        return entry[1], 200, 'stale'
+
+    if response.status_code == 304 and entry is not None:
+        cache.revalidated(an_url, entry[0], response.headers)
+        return entry[1], 304, 'revalidated'
+    cache.store(an_url, response.content, response.headers)
+
+    return response.content, response.status_code, 'network'
+
+
+def fetch_or_none(an_url):
+    """Retrieve the contents of a URL like fetch(), but note a page that cannot be
+    fetched in `failed` instead of raising
+
+    Input: string. URL
+    Output: bytes. The raw contents of the page, or None
+    """
+
+    try:
+        return fetch(an_url)
+    except FetchError as e:
+        with _session_lock:
+            failed.append((an_url, e.reason))
+        return None
+
+
+def fetch_all(urls, workers=None, skip_failed=False):
+    """Retrieve the contents of several URLs concurrently
+
+    Input:  list. List of URLs
+            int. Number of pages fetched at the same time (defaults to max_workers)
+            bool. Return None for a page that cannot be fetched, noting it in `failed`,
+                instead of raising
+    Output: list. The raw contents of each page, in the same order as the URLs
+    """
+
+    urls = list(urls)
+    if not urls:
+        return []
+
+    func = fetch_or_none if skip_failed else fetch
+    workers = min(workers or max_workers, len(urls))
+    if workers == 1:
+        return [func(url) for url in urls]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, urls))
@@ -0,0 +1,239 @@
+'''
+Badge bitmask index for ranked badge queries.
+
+The '<area> vs Badges' sheets are wide 0/1 tables. This index keeps the same facts in
+a few numpy arrays instead: one row per canonical course (one per course code), with
+the badges of the course packed into a small unsigned integer, one bit per badge
+(uint16 for the 11 badges; wider words, or several of them, for larger synthetic
+catalogs), and the number of its badges precomputed with a popcount. Queries are
+vectorized operations over the whole arrays:
+
+    at least k badges         popcount >= k
+    in A and B but not C      mask & (A|B) == (A|B) and mask & C == 0
+    best courses in area X    the rows of area X, ranked by popcount
+
+Results are ranked by badge count, then course code, and can be written as an extra
+workbook sheet (scrape.py --ranked K).
+
+    python src/masks.py --at-least 3
+    python src/masks.py --all ethics --all sustain --none global
+    python src/masks.py --area social --limit 10 --json
+'''
+
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import query
+
+
+# Number of bits set in every byte value, for numpy versions without bitwise_count
+_BYTE_COUNTS = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount(masks):
+    """Count the bits set in every row of a mask array
+
+    Input: numpy array. Masks, one row of words per course
+    Output: numpy array. uint16 counts
+    """
+
+    if hasattr(np, 'bitwise_count'):     # numpy >= 2.0
+        return np.bitwise_count(masks).sum(axis=1, dtype=np.uint16)
+
+    return _BYTE_COUNTS[np.ascontiguousarray(masks).view(np.uint8)].sum(axis=1,
+                                                                        dtype=np.uint16)
+
+
+def _word(count):
+    # Unsigned dtype and number of words holding `count` bits per row
+    for dtype in (np.uint16, np.uint32, np.uint64):
+        bits = np.dtype(dtype).itemsize * 8
+        if count <= bits:
+            return dtype, 1
+
+    return np.uint64, -(-count // 64)
+
+
+class BadgeMasks:
+    """Badge masks of every course of a catalog
+
+    Input:  dict. GE areas as keys and lists of course codes as values
+            dict. Badges as keys and lists of course codes as values
+            dict. Course codes as keys and titles as values
+    """
+
+    def __init__(self, areas, badges, titles):
+        self.badges = list(badges)
+        self.codes = sorted(set(titles) | {code for codes in areas.values() for code in codes}
+                            | {code for codes in badges.values() for code in codes})
+        self.titles = [titles.get(code, '') for code in self.codes]
+        rows = {code: row for row, code in enumerate(self.codes)}
+
+        self.dtype, words = _word(len(self.badges))
+        bits = np.dtype(self.dtype).itemsize * 8
+        self.masks = np.zeros((len(self.codes), words), dtype=self.dtype)
+        for bit, badge in enumerate(self.badges):
+            members = np.fromiter((rows[code] for code in set(badges[badge])), dtype=np.intp)
+            self.masks[members, bit // bits] |= self.dtype(1 << bit % bits)
+        self.counts = popcount(self.masks)
+
+        self.areas = {area: np.unique(np.fromiter((rows[code] for code in codes),
+                                                  dtype=np.intp, count=len(codes)))
+                      for area, codes in areas.items()}
+
+    @classmethod
+    def from_catalog(cls, ges, badges):
+        """Build the index of extracted GE and badge classes
+
+        Input:  dict. GE areas of study and their classes, from extract_ges
+                dict. Badge titles and their classes, from extract_badges
+        Output: BadgeMasks
+        """
+
+        titles = {}
+        for groups in (ges, badges):
+            for courses in groups.values():
+                for course in courses:
+                    titles.setdefault(course.code, course.title)
+
+        return cls({area: [course.code for course in courses]
+                    for area, courses in ges.items()},
+                   {badge: [course.code for course in courses]
+                    for badge, courses in badges.items()}, titles)
+
+    @classmethod
+    def from_index(cls, index):
+        """Build the index of a lookup index written by query.write_index
+
+        Input: dict. Lookup index
+        Output: BadgeMasks
+        """
+
+        return cls(index['areas'], index['badges'],
+                   {code: entry['title'] for code, entry in index['courses'].items()})
+
+    def mask(self, names):
+        """Pack badges into a mask of the same layout as the rows
+
+        Input: list. Badge names, or unique parts of them (see query.find_group)
+        Output: numpy array. One word per row word
+        """
+
+        bits = np.dtype(self.dtype).itemsize * 8
+        packed = np.zeros(self.masks.shape[1], dtype=self.dtype)
+        for name in names:
+            bit = self.badges.index(query.find_group(self.badges, name))
+            packed[bit // bits] |= self.dtype(1 << bit % bits)
+
+        return packed
+
+    def select(self, all_of=(), none_of=(), at_least=0, area=None):
+        """Find the courses in all the given badges, in none of the excluded ones and
+        in at least a number of badges, optionally within a GE area
+
+        Input:  list. Badges a course must be in
+                list. Badges a course must not be in
+                int. Smallest number of badges of a course
+                string. GE area (or a unique part of its name) the courses must be in
+        Output: numpy array. Rows of the matching courses, ranked by number of badges
+            then course code
+        """
+
+        rows = self.areas[query.find_group(self.areas, area)] if area is not None \
+            else np.arange(len(self.codes))
+        masks, counts = self.masks[rows], self.counts[rows]
+
+        keep = counts >= at_least
+        if all_of:
+            wanted = self.mask(all_of)
+            keep &= ((masks & wanted) == wanted).all(axis=1)
+        if none_of:
+            keep &= ((masks & self.mask(none_of)) == 0).all(axis=1)
+        rows, counts = rows[keep], counts[keep]
+
+        # Rows are in course code order, so a stable sort keeps ties by code
+        return rows[np.argsort(-counts.astype(np.int32), kind='stable')]
+
+    def badges_of(self, row):
+        """Names of the badges of a course
+
+        Input: int. Row of the course
+        Output: list
+        """
+
+        bits = np.dtype(self.dtype).itemsize * 8
+        return [badge for bit, badge in enumerate(self.badges)
+                if self.masks[row, bit // bits] >> (bit % bits) & 1]
+
+    def table(self, rows, limit=None):
+        """Tabulate courses: code and title, number of badges and badge names
+
+        Input:  numpy array. Rows, e.g. from select()
+                int. Largest number of courses listed
+        Output: dict. Column names as keys and lists of values as values
+        """
+
+        rows = rows[:limit]
+        return {'Course': [f'{self.codes[row]}: {self.titles[row]}' for row in rows],
+                'Badge count': self.counts[rows].tolist(),
+                'Badges': [', '.join(self.badges_of(row)) for row in rows]}
+
+
+def ranked_courses(ges, badges, at_least=2):
+    """Table of the GE and badge courses in at least a number of badges, ranked by
+    badge count, for the workbook
+
+    Input:  dict. GE areas of study and their classes, from extract_ges
+            dict. Badge titles and their classes, from extract_badges
+            int. Smallest number of badges of a course
+    Output: dict. Column names as keys and lists of values as values
+    """
+
+    index = BadgeMasks.from_catalog(ges, badges)
+
+    return index.table(index.select(at_least=at_least))
+
+
+if __name__ == "__main__":
+
+    start = time.perf_counter()
+
+    parser = argparse.ArgumentParser(
+        description='Rank courses by the number of badges they satisfy.')
+    parser.add_argument('--index', default=query.default_index,
+                        help=f'lookup index written by scrape.py --index '
+                             f'(default: {query.default_index})')
+    parser.add_argument('--at-least', type=int, default=1, metavar='K',
+                        help='list courses in at least K badges (default 1)')
+    parser.add_argument('--all', action='append', default=[], metavar='BADGE',
+                        help='badge a course must be in; may be repeated')
+    parser.add_argument('--none', action='append', default=[], metavar='BADGE',
+                        help='badge a course must not be in; may be repeated')
+    parser.add_argument('--area', help='only courses in this GE area')
+    parser.add_argument('--limit', type=int, help='largest number of courses listed')
+    parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    parser.add_argument('--time', action='store_true',
+                        help='print the elapsed time to stderr')
+    args = parser.parse_args()
+
+    index = BadgeMasks.from_index(query.load_index(args.index))
+    try:
+        rows = index.select(args.all, args.none, args.at_least, args.area)
+    except KeyError as e:
+        raise SystemExit(f'error: {e.args[0]}')
+    table = index.table(rows, args.limit)
+
+    if args.json:
+        print(json.dumps([dict(zip(table, values)) for values in zip(*table.values())],
+                         ensure_ascii=False))
+    else:
+        print(f'{len(rows)} courses')
+        for course, count, names in zip(*table.values()):
+            print(f'  {count:>2}  {course}\n      {names}')
+    if args.time:
+        print(f'{(time.perf_counter() - start) * 1000:.1f} ms', file=sys.stderr)
@@ -0,0 +1,397 @@
+'''
+Smallest sets of courses covering badges and GE areas.
+
+Every badge and GE area to cover is one bit of an integer mask, and every course is
+encoded as the mask of the badges and areas it belongs to. Finding the fewest courses
+(or, with weights such as units, the cheapest) whose masks together cover every bit
+is a weighted set-cover problem:
+
+  - courses with the same mask are interchangeable and are searched as one, keeping
+    the cheapest of them and listing the others as alternatives;
+  - a course that a strictly cheaper course covers entirely is dropped from the
+    exact search, so the top plans never list it; a course tied on weight stays, so
+    that the top plans include equal-cost alternatives;
+  - the exact search is a branch and bound: it branches on the uncovered bit with the
+    fewest candidate courses and prunes a branch as soon as its lower bound (the cost
+    so far plus the cheapest possible cost per uncovered bit) cannot beat the k-th
+    best plan found so far. It returns the k cheapest minimal plans;
+  - large synthetic catalogs (see exact_limit) are solved with the greedy heuristic:
+    most new bits per unit of weight, with lazily updated gains, then redundant
+    courses removed. The exact search also falls back to it after a budget of nodes;
+    the result then says it is not proven optimal.
+
+The courses come from the lookup index written by scrape.py --index (see query.py):
+
+    python src/optimize.py --top 5
+    python src/optimize.py --area social --area arts --taken 'ANTH 001' --json
+'''
+
+
+import argparse
+import heapq
+import json
+import math
+import sys
+import time
+
+import query
+
+
+# Largest number of groups and of distinct courses the 'auto' method solves exactly
+exact_limit = (64, 5000)
+
+
+def encode(groups):
+    """Encode group membership as bitmasks
+
+    Input: dict. Names of the badges and areas to cover as keys and lists of course
+        codes as values
+    Output: tuple. The list of names, bit i standing for the i-th name, and a dict of
+        course codes as keys and masks as values
+    """
+
+    names = list(groups)
+    masks = {}
+    for bit, name in enumerate(names):
+        flag = 1 << bit
+        for code in groups[name]:
+            masks[code] = masks.get(code, 0) | flag
+
+    return names, masks
+
+
+def _options(masks, full, weights):
+    # One option per distinct mask: (mask, weight, codes of that weight), cheapest
+    # per covered bit first
+    by_mask = {}
+    for code, mask in masks.items():
+        mask &= full
+        if not mask:
+            continue
+        weight = weights.get(code, 1)
+        best = by_mask.get(mask)
+        if best is None or weight < best[0]:
+            by_mask[mask] = (weight, [code])
+        elif weight == best[0]:
+            best[1].append(code)
+
+    return sorted(((mask, weight, sorted(codes)) for mask, (weight, codes) in by_mask.items()),
+                  key=lambda option: (option[1] / option[0].bit_count(), option[0]))
+
+
+def _undominated(options):
+    # Indices of the options that no strictly cheaper option covers entirely. Ties on
+    # weight are kept: they make equal-cost alternative plans.
+    kept = []
+    for idx, (mask, weight, _) in enumerate(options):
+        if not any(options[other][0] & mask == mask and options[other][1] < weight
+                   for other in kept):
+            kept.append(idx)
+
+    return kept
+
+
+def _minimal(masks):
+    # Whether every chosen mask covers a bit that no other chosen mask covers
+    for idx, mask in enumerate(masks):
+        others = 0
+        for other_idx, other in enumerate(masks):
+            if other_idx != idx:
+                others |= other
+        if mask & ~others == 0:
+            return False
+
+    return True
+
+
+def exact_cover(options, full, k=1, max_nodes=200000, initial=()):
+    """Find the k cheapest minimal covers with a branch and bound
+
+    Input:  list. (mask, weight, codes) options, see _options()
+            int. Mask of the bits to cover
+            int. Number of plans
+            int. Number of search nodes after which the search gives up
+            list. (cost, [option indices]) of known covers, e.g. from greedy_cover,
+                bounding the search from the start
+    Output: tuple. A list of (cost, [option indices]) sorted by cost, and whether the
+        search finished (so that the plans are proven to be the k best)
+    """
+
+    bits = [1 << bit for bit in range(full.bit_length()) if full & 1 << bit]
+    useful = _undominated(options)
+    candidates = {bit: [idx for idx in useful if options[idx][0] & bit] for bit in bits}
+    weights = {options[idx][1] for idx in useful}
+    unit = weights.pop() if len(weights) == 1 else None
+
+    best, seen = [], set()     # max-heap of (-cost, plan) holding the k best plans
+    nodes = 0
+
+    def add(cost, plan):
+        if plan not in seen and _minimal([options[idx][0] for idx in plan]):
+            seen.add(plan)
+            heapq.heappush(best, (-cost, plan))
+            if len(best) > k:
+                heapq.heappop(best)
+
+    for cost, plan in initial:
+        add(cost, tuple(sorted(plan)))
+
+    # No course covers more bits than the largest mask, nor covers a bit for less
+    # than the cheapest weight per bit
+    most = max(options[idx][0].bit_count() for idx in useful)
+    cheapest = min(options[idx][1] / options[idx][0].bit_count() for idx in useful)
+
+    def lower_bound(uncovered, cost):
+        remaining = uncovered.bit_count()
+        if unit is not None:
+            return cost + unit * math.ceil(remaining / most)
+        return cost + remaining * cheapest
+
+    def search(covered, chosen, cost):
+        nonlocal nodes
+        nodes += 1
+        if covered == full:
+            add(cost, tuple(sorted(chosen)))
+            return
+        if nodes > max_nodes:
+            return
+
+        uncovered = full & ~covered
+        if len(best) == k and lower_bound(uncovered, cost) >= -best[0][0]:
+            return
+        # Branch on the uncovered bit that the fewest courses cover
+        bit = min((bit for bit in bits if uncovered & bit),
+                  key=lambda bit: len(candidates[bit]))
+        for idx in candidates[bit]:
+            search(covered | options[idx][0], chosen + [idx], cost + options[idx][1])
+
+    search(0, [], 0)
+
+    return sorted((-cost, list(plan)) for cost, plan in best), nodes <= max_nodes
+
+
+def greedy_cover(options, full, k=1):
+    """Cover the bits greedily: repeatedly take the course with the most new bits per
+    unit of weight, then drop the courses the others make redundant. Each of the k
+    plans starts from a different course covering the rarest bit.
+
+    The gain of a course only shrinks as bits get covered, so the courses wait in a
+    heap under their last computed gain and only the one on top is re-evaluated.
+
+    Input:  list. (mask, weight, codes) options, see _options()
+            int. Mask of the bits to cover
+            int. Number of plans
+    Output: list. (cost, [option indices]) sorted by cost
+    """
+
+    counts = {}
+    for mask, _, _ in options:
+        while mask:
+            bit = mask & -mask
+            counts[bit] = counts.get(bit, 0) + 1
+            mask ^= bit
+    rarest = min(counts, key=lambda bit: (counts[bit], bit))
+    starts = [idx for idx, option in enumerate(options) if option[0] & rarest][:k]
+
+    plans = {}
+    for start in starts:
+        chosen, covered = [start], options[start][0]
+        heap = [(-(mask & ~covered).bit_count() / weight, idx)
+                for idx, (mask, weight, _) in enumerate(options) if mask & ~covered]
+        heapq.heapify(heap)
+        while covered != full:
+            _, idx = heapq.heappop(heap)
+            gain = (options[idx][0] & ~covered).bit_count()
+            if not gain:
+                continue
+            score = -gain / options[idx][1]
+            if heap and (score, idx) > heap[0]:
+                heapq.heappush(heap, (score, idx))
+                continue
+            chosen.append(idx)
+            covered |= options[idx][0]
+        # Drop redundant courses, most expensive first
+        for idx in sorted(chosen, key=lambda idx: -options[idx][1]):
+            rest = [other for other in chosen if other != idx]
+            if rest and _union(options, rest) == full:
+                chosen = rest
+        plan = tuple(sorted(chosen))
+        plans[plan] = sum(options[idx][1] for idx in plan)
+
+    return sorted((cost, list(plan)) for plan, cost in plans.items())
+
+
+def _union(options, chosen):
+    covered = 0
+    for idx in chosen:
+        covered |= options[idx][0]
+
+    return covered
+
+
+def cover(groups, weights=None, k=1, method='auto', max_nodes=200000):
+    """Find the smallest (or cheapest) sets of courses covering every group
+
+    Input:  dict. Names of the badges and areas to cover as keys and lists of course
+                codes as values
+            dict. Optional weights of the courses (e.g. units); 1 by default
+            int. Number of plans
+            string. 'exact', 'greedy', or 'auto': greedy for large problems (more than
+                exact_limit groups or courses), else exact within max_nodes, keeping
+                the greedy plans if the search runs out of nodes
+            int. Node budget of the exact search
+    Output: dict. {'plans': [{'cost': ..., 'courses': [{'course': code,
+        'alternatives': [codes], 'covers': [names]}]}], 'optimal': bool,
+        'uncoverable': [names no course covers]}
+    """
+
+    weights = weights or {}
+    if any(weight <= 0 for weight in weights.values()):
+        raise ValueError('course weights must be positive')
+
+    names, masks = encode(groups)
+    full = 0
+    for mask in masks.values():
+        full |= mask
+    options = _options(masks, full, weights)
+    if method == 'auto' and (len(names) > exact_limit[0] or len(options) > exact_limit[1]):
+        method = 'greedy'
+
+    optimal = False
+    if not options:
+        plans = []
+    elif method == 'greedy':
+        plans = greedy_cover(options, full, k)
+    else:
+        # Greedy plans bound the search from the start and stand in for the plans it
+        # does not find if it runs out of nodes
+        plans, optimal = exact_cover(options, full, k,
+                                     max_nodes if method == 'auto' else math.inf,
+                                     greedy_cover(options, full, k))
+
+    return {'plans': [{'cost': cost, 'courses': [
+                {'course': options[idx][2][0], 'alternatives': options[idx][2][1:],
+                 'covers': [name for bit, name in enumerate(names)
+                            if options[idx][0] & 1 << bit]}
+                for idx in sorted(plan, key=lambda idx: options[idx][2][0])]}
+                      for cost, plan in plans],
+            'optimal': optimal,
+            'uncoverable': [name for bit, name in enumerate(names) if not full & 1 << bit]}
+
+
+def plan_courses(index, areas=None, badges=None, taken=(), weights=None, k=5,
+                 method='auto', max_nodes=200000):
+    """Find the smallest sets of courses covering badges and GE areas of a lookup index
+
+    Input:  dict. Lookup index, see query.py
+            list. Names of the GE areas to cover (or unique parts of them); every area
+                if None
+            list. Names of the badges to cover; every badge if None
+            list. Codes of the courses already taken: the groups they are in need no
+                other course
+            dict. Optional weights of the courses, e.g. units
+            int. Number of plans
+            string. 'auto', 'exact' or 'greedy', see cover()
+            int. Node budget of the exact search
+    Output: dict. cover() result with the course titles added, and the groups the
+        taken courses already cover under 'taken'
+    """
+
+    selected = {}
+    for kind, names in (('areas', areas), ('badges', badges)):
+        for name in index[kind] if names is None else names:
+            group = query.find_group(index[kind], name)
+            selected[group] = index[kind][group]
+
+    done = set()
+    for text in taken:
+        entry = query.lookup_course(index, text)
+        done.update(group for group in entry['areas'] + entry['badges'] if group in selected)
+
+    result = cover({group: codes for group, codes in selected.items() if group not in done},
+                   weights, k, method, max_nodes)
+    for plan in result['plans']:
+        for course in plan['courses']:
+            course['title'] = index['courses'][course['course']]['title']
+    result['taken'] = sorted(done)
+
+    return result
+
+
+def format_plans(result):
+    """Format the plans of plan_courses() as text
+
+    Input: dict. Result of plan_courses
+    Output: string
+    """
+
+    lines = []
+    if result['taken']:
+        lines.append(f"Already covered: {', '.join(result['taken'])}")
+    if result['uncoverable']:
+        lines.append(f"No course covers: {', '.join(result['uncoverable'])}")
+    if not result['plans'] and not result['uncoverable']:
+        lines.append('Already satisfied: every requested badge and area is covered')
+    if not result['optimal'] and result['plans']:
+        lines.append('Search stopped early: plans are not proven optimal')
+    for number, plan in enumerate(result['plans'], 1):
+        lines.append(f"Plan {number}: {len(plan['courses'])} courses, cost {plan['cost']:g}")
+        for course in plan['courses']:
+            lines.append(f"  {course['course']}: {course['title']}")
+            lines.append(f"      covers {', '.join(course['covers'])}")
+            if course['alternatives']:
+                lines.append(f"      or {', '.join(course['alternatives'])}")
+
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+
+    start = time.perf_counter()
+
+    parser = argparse.ArgumentParser(
+        description='Find the smallest sets of courses covering every badge and the '
+                    'remaining GE areas.')
+    parser.add_argument('--index', default=query.default_index,
+                        help=f'lookup index written by scrape.py --index '
+                             f'(default: {query.default_index})')
+    parser.add_argument('--area', action='append',
+                        help='GE area to cover (or a unique part of its name); may be '
+                             'repeated (default: every area)')
+    parser.add_argument('--no-areas', action='store_true', help='cover the badges only')
+    parser.add_argument('--badge', action='append',
+                        help='badge to cover; may be repeated (default: every badge)')
+    parser.add_argument('--taken', action='append', default=[], metavar='COURSE',
+                        help='course already taken; may be repeated')
+    parser.add_argument('--weight', action='append', default=[], metavar='COURSE=WEIGHT',
+                        help='weight of a course, e.g. its units (default 1); may be '
+                             'repeated')
+    parser.add_argument('--top', type=int, default=5, help='number of plans')
+    parser.add_argument('--method', choices=['auto', 'exact', 'greedy'], default='auto')
+    parser.add_argument('--max-nodes', type=int, default=200000,
+                        help='node budget of the exact search (auto method)')
+    parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    parser.add_argument('--time', action='store_true',
+                        help='print the elapsed time to stderr')
+    args = parser.parse_args()
+
+    index = query.load_index(args.index)
+    weights = {}
+    for weight in args.weight:
+        code, _, value = weight.rpartition('=')
+        try:
+            weights[query.course_code(code) or code] = float(value)
+        except ValueError:
+            parser.error(f'--weight expects COURSE=WEIGHT, not {weight!r}')
+
+    try:
+        result = plan_courses(index, [] if args.no_areas else args.area, args.badge,
+                              args.taken, weights, args.top, args.method, args.max_nodes)
+    except KeyError as e:
+        raise SystemExit(f'error: {e.args[0]}')
+    except ValueError as e:
+        raise SystemExit(f'error: {e}')
+
+    print(json.dumps(result, ensure_ascii=False) if args.json else format_plans(result))
+    if args.time:
+        print(f'{(time.perf_counter() - start) * 1000:.1f} ms', file=sys.stderr)
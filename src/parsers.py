@@ -0,0 +1,121 @@
+'''
+Selectable HTML parser backend for every BeautifulSoup object built by the scraper.
+
+BeautifulSoup's built-in 'html.parser' is pure Python and is by far the slowest option
+for the large catalog pages. When lxml is installed it is used instead; if a requested
+backend is not installed the scraper falls back to the next available one rather than
+failing.
+
+Pages can also be parsed partially: given a list of declared targets, only the subtrees
+rooted at matching tags are built, which saves both time and memory on the large
+catalog page. Partial parsing needs BeautifulSoup 4.13 or later; older versions parse
+the whole page instead.
+'''
+
+
+import warnings
+
+from bs4 import BeautifulSoup, FeatureNotFound
+
+import tracing
+
+try:
+    from bs4.filter import ElementFilter
+except ImportError:     # BeautifulSoup < 4.13
+    ElementFilter = None
+
+
+# Backends tried, in order, when the parser is set to 'auto'
+preferred = ['lxml', 'html.parser']
+
+# Backend currently used by make_soup()
+parser = 'html.parser'
+
+
+def available(name):
+    """Check whether a parser backend is installed
+
+    Input: string. Name of a BeautifulSoup parser backend, e.g. 'lxml'
+    Output: bool
+    """
+
+    try:
+        BeautifulSoup('', features=name)
+    except FeatureNotFound:
+        return False
+
+    return True
+
+
+def set_parser(name='auto'):
+    """Select the parser backend used by make_soup(). Falls back to the first available
+    backend in `preferred` if the requested one is not installed.
+
+    Input: string. Name of a parser backend, or 'auto' for the fastest installed one
+    Output: string. Name of the backend actually selected
+    """
+
+    global parser
+
+    if name != 'auto' and available(name):
+        parser = name
+        return parser
+
+    if name != 'auto':
+        warnings.warn(f"Parser backend '{name}' is not installed; falling back.")
+
+    parser = next(backend for backend in preferred if available(backend))
+
+    return parser
+
+
+def _attr_matches(value, wanted):
+    if value is None:
+        return False
+    if isinstance(value, str):
+        value = value.split() if ' ' in value else [value]
+
+    return wanted in value
+
+
+if ElementFilter is not None:
+
+    class Targets(ElementFilter):
+        """Parse filter keeping only the subtrees rooted at the declared targets
+
+        Input: list. (tag name, attributes dict) pairs, e.g. [('h1', {'class': 'title'})]
+        """
+
+        def __init__(self, targets):
+            super().__init__()
+            self.targets = list(targets)
+
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            attrs = attrs or {}
+            for tag_name, tag_attrs in self.targets:
+                if name == tag_name and all(_attr_matches(attrs.get(key), value)
+                                            for key, value in tag_attrs.items()):
+                    return True
+            return False
+
+        def allow_string_creation(self, string):
+            return False
+
+
+@tracing.traced('parse')
+def make_soup(content, targets=None):
+    """Parse a page with the selected backend
+
+    Input:  bytes or string. Raw contents of a page
+            list. Optional (tag name, attributes dict) pairs; if given, only those tags
+                and everything inside them are parsed
+    Output: BS4 object. A parsed Beautiful Soup object
+    """
+
+    if targets is None or ElementFilter is None or parser == 'html5lib':
+        return BeautifulSoup(content, features=parser)
+
+    return BeautifulSoup(content, features=parser, parse_only=Targets(targets))
+
+
+set_parser('auto')
@@ -0,0 +1,152 @@
+'''
+Content-hash driven incremental pipeline.
+
+The scraper runs as a chain of stages: fetch -> extract_ges / extract_badges ->
+cross_reference (in_or_not, department groups, xref) -> export. Every stage is
+identified by a fingerprint: a hash of the stage name, of the source code of the
+scraper and of the fingerprints of its inputs. The output of each stage is saved
+together with its fingerprint, so when a re-run finds the same fingerprint the saved
+output is reused instead of recomputing it. Since the fetched pages are fingerprinted
+by their contents, only the stages downstream of a page that actually changed are run
+again.
+'''
+
+
+import hashlib
+import os
+import pickle
+
+import tracing
+
+
+def digest(*parts):
+    """Hash any number of byte strings or strings into one fingerprint
+
+    Input: bytes or strings
+    Output: string. Hex digest
+    """
+
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        hasher.update(hashlib.sha256(part).digest())
+
+    return hasher.hexdigest()
+
+
+def source_digest(paths):
+    """Fingerprint source files so that editing the code invalidates every stage
+
+    Input: list. Paths of source files
+    Output: string. Hex digest
+    """
+
+    contents = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+
+    return digest(*contents)
+
+
+class Pipeline:
+    """Run stages, reusing the saved output of a stage whose fingerprint is unchanged
+
+    Input:  string. Directory holding the saved stage outputs
+            string. Fingerprint of the code running the stages, see source_digest()
+            bool. Recompute every stage regardless of the saved outputs
+    """
+
+    def __init__(self, directory, code_digest='', force=False):
+        self.directory = directory
+        self.code_digest = code_digest
+        self.force = force
+        self.ran, self.reused = [], []
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, f'{name}.pickle')
+
+    def stage(self, name, inputs, func, *args, outputs=()):
+        """Run a stage unless its saved output was produced from the same inputs
+
+        Input:  string. Name of the stage
+                list. Fingerprints of everything the stage depends on
+                function. Computes the stage output from *args
+                tuple. Files the stage writes; the stage is re-run if one is missing
+        Output: tuple. The stage output and its fingerprint
+        """
+
+        key = digest(name, self.code_digest, *inputs)
+        path = self._path(name)
+
+        with tracing.span(name, 'stage', reused=False) as fields:
+            if not self.force and all(os.path.exists(output) for output in outputs):
+                try:
+                    with open(path, 'rb') as f:
+                        saved_key, value = pickle.load(f)
+                except (OSError, EOFError, AttributeError, ValueError,
+                        pickle.UnpicklingError):
+                    saved_key = None
+                if saved_key == key:
+                    self.reused.append(name)
+                    fields['reused'] = True
+                    return value, key
+
+            value = func(*args)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.ran.append(name)
+
+        return value, key
+
+    def map(self, name, items, func):
+        """Run a function on many inputs, reusing the saved result of every input whose
+        fingerprint is unchanged, so that a run only recomputes the changed inputs
+
+        Input:  string. Name of the stage
+                list. (fingerprint, argument) of every input
+                function. Computes the result of one argument
+        Output: tuple. The results, in the order of the inputs, and the fingerprint of
+            the stage
+        """
+
+        keys = [digest(name, self.code_digest, fingerprint) for fingerprint, _ in items]
+        path = self._path(name)
+
+        with tracing.span(name, 'stage', reused=False) as fields:
+            saved = {}
+            if not self.force:
+                try:
+                    with open(path, 'rb') as f:
+                        saved = pickle.load(f)
+                except (OSError, EOFError, AttributeError, ValueError,
+                        pickle.UnpicklingError):
+                    pass
+                if not isinstance(saved, dict):
+                    saved = {}
+
+            results, ran = {}, 0
+            for key, (_, arg) in zip(keys, items):
+                if key not in results:
+                    if key in saved:
+                        results[key] = saved[key]
+                    else:
+                        results[key] = func(arg)
+                        ran += 1
+            fields.update(reused=not ran, ran=ran, inputs=len(items))
+
+            if ran or len(saved) != len(results):
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            if ran:
+                self.ran.append(f'{name} ({ran} of {len(items)})')
+            else:
+                self.reused.append(name)
+
+        return [results[key] for key in keys], digest(name, *keys)
@@ -0,0 +1,288 @@
+'''
+Course lookups from a prebuilt index.
+
+scrape.py --index writes the GE areas, badges and courses of a run to a small JSON
+index keyed for direct lookups:
+
+    {"version": 1, "catalog": ..., "created": ...,
+     "courses": {"ANTH 001": {"title": ..., "areas": [...], "badges": [...]}, ...},
+     "areas": {"Social Science Courses": ["ANTH 001", ...], ...},
+     "badges": {"Ethics": ["PHIL 005", ...], ...},
+     "groups": {"STEM": ["BIO 001", ...], ...}}
+
+The optional "groups" lists the badge courses of every department group (see
+scrape.department_groups).
+
+This module answers queries from that file alone: it needs no network and imports
+neither pandas nor BeautifulSoup, so a lookup takes a few milliseconds including the
+interpreter start.
+
+    python src/query.py --course "ANTH 001"
+    python src/query.py --badge ethics --area social
+    printf 'ANTH 001\\nbadge: Ethics\\n' | python src/query.py --batch --json
+'''
+
+
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import re
+import sys
+import time
+
+
+index_version = 1
+default_index = 'data/index.json'
+
+_CODE = re.compile(r'\s*([A-Za-z]{2,5})\s*(\d{1,3})([A-Za-z]{0,2})\s*$')
+
+
+def write_index(ges, badges, path, catalog=None, groups=None):
+    """Write the lookup index of the extracted GE and badge classes
+
+    Input:  dict. GE areas of study and their classes, from extract_ges
+            dict. Badge titles and their classes, from extract_badges
+            string. Path of the index
+            string. Optional label of the catalog, e.g. its year or URL
+            dict. Optional department groups as keys and lists of badge courses as
+                values
+    Output: string. Path of the index
+    """
+
+    courses, lists = {}, {'areas': {}, 'badges': {}}
+    for kind, group_dict in (('areas', ges), ('badges', badges)):
+        for group, members in group_dict.items():
+            codes = lists[kind][group] = []
+            for course in members:
+                entry = courses.setdefault(course.code, {'title': course.title,
+                                                         'areas': [], 'badges': []})
+                if group not in entry[kind]:
+                    entry[kind].append(group)
+                    codes.append(course.code)
+
+    index = {'version': index_version,
+             'catalog': catalog or '',
+             'created': datetime.now(timezone.utc).isoformat(),
+             'courses': dict(sorted(courses.items())),
+             **lists,
+             'groups': {name: [course.code for course in members]
+                        for name, members in (groups or {}).items()}}
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def load_index(path=default_index):
+    """Load a lookup index written by write_index()
+
+    Input: string. Path of the index
+    Output: dict
+    """
+
+    with open(path, encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get('version') != index_version:
+        raise ValueError(f"{path} is index version {index.get('version')}; "
+                         f'expected version {index_version}')
+
+    return index
+
+
+def course_code(text):
+    """Normalize a course code as typed by a user, e.g. 'anth1' -> 'ANTH 001'
+
+    Input: string
+    Output: string. Canonical course code, or None if the text is not a course code
+    """
+
+    match = _CODE.match(text)
+    if match is None:
+        return None
+    dept, number, suffix = match.groups()
+
+    return f'{dept.upper()} {int(number):03d}{suffix.upper()}'
+
+
+def find_group(groups, name):
+    """Find a GE area or badge by name: an exact match ignoring case, else the only
+    group whose name contains the given text
+
+    Input:  dict. Group names as keys
+            string. Name as typed by a user
+    Output: string. The group name
+    """
+
+    wanted = name.strip().casefold()
+    for group in groups:
+        if group.casefold() == wanted:
+            return group
+
+    matches = [group for group in groups if wanted in group.casefold()]
+    if len(matches) == 1:
+        return matches[0]
+    if not matches:
+        raise KeyError(f'no match for {name!r}')
+    raise KeyError(f"{name!r} is ambiguous: {', '.join(matches)}")
+
+
+def lookup_course(index, text):
+    """Look up the GE areas and badges a course satisfies
+
+    Input:  dict. Lookup index
+            string. Course code, e.g. 'ANTH 001'
+    Output: dict. {'course': code, 'title': ..., 'areas': [...], 'badges': [...]}
+    """
+
+    code = course_code(text)
+    if code is None or code not in index['courses']:
+        raise KeyError(f'no course {text!r}')
+
+    return {'course': code, **index['courses'][code]}
+
+
+def lookup_groups(index, areas=(), badges=()):
+    """List the courses in every given GE area and badge
+
+    Input:  dict. Lookup index
+            list. Names of GE areas
+            list. Names of badges
+    Output: dict. {'areas': [...], 'badges': [...], 'courses': [{'course': code,
+        'title': ...}]}; the courses listed in all the given groups
+    """
+
+    found = {'areas': [find_group(index['areas'], name) for name in areas],
+             'badges': [find_group(index['badges'], name) for name in badges]}
+
+    codes = None
+    for kind, names in found.items():
+        for name in names:
+            members = index[kind][name]
+            if codes is None:
+                codes = members
+            else:
+                members = set(members)
+                codes = [code for code in codes if code in members]
+
+    found['courses'] = [{'course': code, 'title': index['courses'][code]['title']}
+                        for code in codes or []]
+
+    return found
+
+
+def run_query(index, courses=(), areas=(), badges=()):
+    """Answer one query
+
+    Input:  dict. Lookup index
+            list. Course codes to look up
+            list. Names of GE areas
+            list. Names of badges
+    Output: list. One result per course code, then one for the group query if any;
+        a result is {'error': message} when nothing matches
+    """
+
+    results = []
+    for text in courses:
+        try:
+            results.append(lookup_course(index, text))
+        except KeyError as e:
+            results.append({'error': e.args[0]})
+    if areas or badges:
+        try:
+            results.append(lookup_groups(index, areas, badges))
+        except KeyError as e:
+            results.append({'error': e.args[0]})
+
+    return results
+
+
+def parse_line(line):
+    """Parse one line of a batch: 'course: ANTH 001', 'badge: Ethics',
+    'area: Social Science' or a bare course code. Several queries may be joined with
+    ';' to intersect groups, e.g. 'badge: Ethics; area: Arts'
+
+    Input: string
+    Output: tuple. Lists of course codes, areas and badges
+    """
+
+    queries = {'course': [], 'area': [], 'badge': []}
+    for part in line.split(';'):
+        kind, sep, value = part.partition(':')
+        kind = kind.strip().lower()
+        if sep and kind in queries:
+            queries[kind].append(value.strip())
+        elif part.strip():
+            queries['course'].append(part.strip())
+
+    return queries['course'], queries['area'], queries['badge']
+
+
+def format_result(result):
+    """Format a query result as text
+
+    Input: dict. Result of lookup_course or lookup_groups
+    Output: string
+    """
+
+    if 'error' in result:
+        return f"error: {result['error']}"
+    if 'course' in result:
+        return '\n'.join([f"{result['course']}: {result['title']}",
+                          f"  GE areas: {', '.join(result['areas']) or 'none'}",
+                          f"  Badges: {', '.join(result['badges']) or 'none'}"])
+
+    groups = ' & '.join(result['areas'] + result['badges'])
+    lines = [f"{groups} ({len(result['courses'])} courses)"]
+    lines += [f"  {course['course']}: {course['title']}" for course in result['courses']]
+
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+
+    start = time.perf_counter()
+
+    parser = argparse.ArgumentParser(
+        description='Look up which GE areas and badges a course satisfies, or which '
+                    'courses are in a GE area and/or badge.')
+    parser.add_argument('--index', default=default_index,
+                        help=f'lookup index written by scrape.py --index '
+                             f'(default: {default_index})')
+    parser.add_argument('--course', action='append', default=[],
+                        help="course code, e.g. 'ANTH 001'; may be repeated")
+    parser.add_argument('--area', action='append', default=[],
+                        help='GE area (or a unique part of its name); may be repeated')
+    parser.add_argument('--badge', action='append', default=[],
+                        help='badge (or a unique part of its name); may be repeated')
+    parser.add_argument('--batch', action='store_true',
+                        help="read one query per line from stdin, e.g. 'ANTH 001' or "
+                             "'badge: Ethics; area: Arts'")
+    parser.add_argument('--json', action='store_true',
+                        help='print every result as a line of JSON')
+    parser.add_argument('--time', action='store_true',
+                        help='print the elapsed time to stderr')
+    args = parser.parse_args()
+
+    index = load_index(args.index)
+
+    if args.batch:
+        queries = (parse_line(line) for line in sys.stdin if line.strip())
+    else:
+        if not (args.course or args.area or args.badge):
+            parser.error('give --course, --area, --badge or --batch')
+        queries = [(args.course, args.area, args.badge)]
+
+    failed = False
+    for query in queries:
+        for result in run_query(index, *query):
+            failed |= 'error' in result
+            print(json.dumps(result, ensure_ascii=False) if args.json
+                  else format_result(result))
+
+    if args.time:
+        print(f'{(time.perf_counter() - start) * 1000:.1f} ms', file=sys.stderr)
+    sys.exit(1 if failed else 0)
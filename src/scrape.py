@@ -23,50 +23,164 @@ and cross-reference the various sets of courses.
 '''
 
 
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import os
+import re
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
 import pandas as pd
 
+from archive import ArchiveReader, ArchiveWriter
+from cache import DiskCache
+from course import Course, parse_course
+from crawl import canonicalize, crawl
+from diff import changes_table, diff_history
+from export import export, output_formats
+import fastpath
+import fetch as fetch_layer
+from fetch import FetchError, fetch, fetch_all
+from masks import ranked_courses
+import parsers
+from parsers import make_soup, set_parser
+from pipeline import Pipeline, digest, source_digest
+from query import write_index
+from snapshot import load_snapshot, save_snapshot
+import tracing
+from tracing import span
+
+
+# Catalog years and the (catoid, poid) of their GE requirements page. Add a year with
+# --catalog YEAR=CATOID:POID.
+catalogs = {
+    '2019': (16, 1986),
+    '2020': (17, 2135),
+}
 
 ge_url = 'https://catalog.ucmerced.edu/preview_program.php?catoid=17&poid=2135'
 badge_url = 'https://ge.ucmerced.edu/intellectual-experience-badges'
 
+# Named groups of departments. Every group gets a '<name> vs Badges' sheet cross-
+# referencing the badge courses offered by its departments; the first value is the
+# column title of the sheet.
+department_groups = {
+    'STEM': ('Engineering Majors / 11 Intellectual Badges',
+             ['BIO', 'BIOE', 'CHEM', 'CSE', 'ENGR',
+              'ENVE', 'ESS', 'MATH', 'ME', 'MSE', 'PHYS']),
+}
+
+# Parts of the pages used by extract_ges and extract_badges. Only these subtrees are
+# built when the pages are parsed; set to None to build the whole tree.
+ge_targets = [('a', {'href': '#'}), ('div', {'class': 'acalog-core'})]
+badge_targets = [('div', {'id': 'content-col2-1'}), ('h1', {'class': 'title'})]
+program_targets = [('a', {'href': '#'}), ('h1', {'id': 'acalog-content'})]
+
+
+def catalog_url(catoid, poid):
+    """Build the URL of a catalog program page
+
+    Input:  int. Catalog id (one per catalog year)
+            int. Program id within the catalog
+    Output: string. URL
+    """
+
+    return f'https://catalog.ucmerced.edu/preview_program.php?catoid={catoid}&poid={poid}'
+
 
-def scrape_parse(an_url):
+def scrape_parse(an_url, targets=None):
     """Scrape, parses website and returns a Beautiful Soup object
 
-    Input: string. URL
+    Input:  string. URL
+            list. Optional (tag name, attributes dict) pairs limiting what is parsed
     Output: BS4 object. A parsed Beautiful Soup object
     """
 
-    courses = requests.get(an_url)
-    soup = BeautifulSoup(courses.content, features='html.parser')
+    courses = fetch(an_url)
+    soup = make_soup(courses, targets)
 
     return soup
 
 
-def badge_links(an_url):
-    """Scrapes and crawls website before parsing and returning a Beautiful Soup object
+def badge_pages(an_url, workers=None, skip_failed=False):
+    """Scrapes the badges website and fetches every badge page it links to: the pages
+    directly under the badges page, see crawl.crawl
 
-    Input: string. URL
-    Output: list. A list of parsed Beautiful Soup objects
+    Input:  string. URL
+            int. Number of badge pages fetched at the same time
+            bool. Leave out the badge pages that cannot be fetched (they are listed in
+                fetch.failed) instead of raising FetchError
+    Output: dict. URLs as keys and the raw contents of the badge pages as values, in
+        the order of the links
     """
 
-    badges = requests.get(an_url)
-    soup = BeautifulSoup(badges.content, features='html.parser')
+    pages = crawl([an_url], include=[re.escape(canonicalize(an_url)) + r'/[^/]+$'],
+                  max_depth=1, workers=workers, skip_failed=skip_failed)
+
+    return {link: content for link, depth, content in pages if depth == 1}
 
-    badge_links = []
-    for item in soup.find_all('a'):
-        if 'https://ge.ucmerced.edu/intellectual-experience-badges' in item.get('href'):
-            badge_links.append(item.get('href'))
+
+def program_pages(an_url, workers=None, skip_failed=False):
+    """Fetches every program page of a catalog that a catalog page links to, e.g. the
+    acalog page listing all the programs (content.php?catoid=17&navoid=...)
+
+    Input:  string. URL of the catalog page
+            int. Number of program pages fetched at the same time
+            bool. Leave out the program pages that cannot be fetched (they are listed
+                in fetch.failed) instead of raising FetchError
+    Output: dict. Program ids (poid) as keys and the raw contents of the program pages
+        as values, in the order of the links
+    """
+
+    catoid = parse_qs(urlsplit(an_url).query).get('catoid')
+    catoid = re.escape(catoid[0]) if catoid else r'\d+'
+    pattern = re.compile(rf'/preview_program\.php\?catoid={catoid}&poid=(\d+)(?:&|$)')
+
+    programs = {}
+    for link, depth, content in crawl([an_url], include=[pattern], max_depth=1,
+                                      workers=workers, skip_failed=skip_failed):
+        if depth == 1:
+            programs.setdefault(int(pattern.search(link).group(1)), content)
+
+    return programs
+
+
+def badge_links(an_url, workers=None, targets=None):
+    """Scrapes and crawls website before parsing and returning a Beautiful Soup object.
+    The badge pages are fetched concurrently over the shared session.
+
+    Input:  string. URL
+            int. Number of badge pages fetched at the same time
+            list. Optional (tag name, attributes dict) pairs limiting what is parsed
+                on each badge page
+    Output: list. A list of parsed Beautiful Soup objects
+    """
 
     soup_contents = []
-    for link in badge_links:
-        soup_contents.append(scrape_parse(link))
+    for link, page in badge_pages(an_url, workers).items():
+        with tracing.page(link):
+            soup_contents.append(make_soup(page, targets))
 
     return soup_contents
 
 
+def badge_soups(pages, urls=None):
+    """Parse badge pages with BeautifulSoup, attributing each parse to its page in the
+    trace
+
+    Input:  list. Raw contents of the badge pages
+            list. URLs of the badge pages
+    Output: list. A list of parsed Beautiful Soup objects
+    """
+
+    soups = []
+    for an_url, page in zip(urls or [None] * len(pages), pages):
+        with tracing.page(an_url):
+            soups.append(make_soup(page, badge_targets))
+
+    return soups
+
+
 def extract_ges(ge_contents):
     """Create a dictionary of extracted text from parsed ge web contents where keys are
     the area of study and values are its respective classes
@@ -77,29 +191,37 @@ def extract_ges(ge_contents):
 
     # Retrieves classes for all areas of study listed on the webpage
     courses = ge_contents.find_all("a", href="#")
-    ges = [course.text for course in courses]
 
-    # Remove all superfluous non-alphanumeric characters from class names such as
-    # "/a" or "/as", but keep a record of those classes as a check.
-    err_strs = []
+    # Retrieves headers for areas of study of classes
+    areas = ge_contents.find_all("div", "acalog-core")
 
-    for idx, ele in enumerate(ges):
-        if ("/as" in ele) or ("/a" in ele):
-            err_strs.append(ele)
-            ges[idx] = ele.replace("/as", "").replace("/a", "")
+    return ges_from_text([course.text for course in courses],
+                         [[x.text for x in ele][0] for ele in areas])
 
-    # Split the classes according to their areas of study
-    # By looking at the first letter of the class name, a break between the two areas
-    # of study can be found since the classes in each area of study are listed in
-    # alphabetical order.
-    for idx in range(1, len(ges)):
-        if ges[idx-1][0] > ges[idx][0]:
-            split_at = idx
 
-    # Retrieves headers for areas of study of classes
-    areas = ge_contents.find_all("div", "acalog-core")
-    study_area = [[x.text for x in ele][0] for ele in areas[:-1]]
-    ge_classes = [ges[:split_at], ges[split_at:]]
+def ges_from_text(ges, headers):
+    """Group the text of the GE course links under their areas of study
+
+    Input:  list. Text of every course link on the GE page, in page order
+            list. Text of the first element of every 'acalog-core' block on the page
+    Output: dict. A dictionary where keys are GE areas of study and values are GE classes
+    """
+
+    # Parse the class names into course records. Superfluous non-alphanumeric
+    # characters such as "/a" or "/as" are removed while parsing.
+    ges = [course for course in map(parse_course, ges) if course is not None]
+
+    # The last 'acalog-core' block holds no courses
+    study_area = headers[:-1]
+
+    # Split the classes according to their areas of study
+    # By looking at the first letter of the class name, the breaks between areas of
+    # study can be found since the classes in each area of study are listed in
+    # alphabetical order. A course listed out of order makes an extra break; only the
+    # last breaks are kept, one fewer than the areas, so that no course is dropped.
+    breaks = [idx for idx in range(1, len(ges)) if ges[idx-1].dept[0] > ges[idx].dept[0]]
+    starts = [0] + breaks[len(breaks) - max(len(study_area) - 1, 0):] + [len(ges)]
+    ge_classes = [ges[start:end] for start, end in zip(starts, starts[1:])]
 
     # Create a dictionary where keys are areas of study and values are list of
     # classes in the field.
@@ -114,75 +236,261 @@ def extract_badges(badge_contents):
     Output: dict. A dictionary where keys are badge titles and values are badge classes
     """
 
-    # Retrieves classes for all badges listed on the webpage
-    all_classes = []
+    # Retrieves the headers and the classes of all badges listed on the webpages
+    titles, contents = [], []
     for badge in badge_contents:
-        contents = badge.find("div", id="content-col2-1")
-        stripped_contents = []
-        for course in contents.text.split('\n'):
-            if ":" in course:
-                stripped_contents.append(course)
-        for idx, ele in enumerate(stripped_contents):
-            if ("\xa0" in ele) or ("/as" in ele) or ("/a" in ele) or ("\t" in ele):
-                stripped_contents[idx] = ele.replace("\xa0", "").replace(
-                    "/as", "").replace("/a", "").replace("\t", "")
+        titles.append(badge.find('h1', class_='title').text)
+        contents.append(badge.find("div", id="content-col2-1").text)
+
+    return badges_from_text(titles, contents)
 
-        all_classes.append(stripped_contents)
 
-    # Retrieves headers for badge titles and courses
-    badges = []
-    for content in badge_contents:
-        badges.append(content.find('h1', class_='title'))
+def badges_from_text(titles, contents):
+    """Pair up the badge titles with the classes listed on each badge page
+
+    Input:  list. Text of the title of every badge page
+            list. Text of the course list of every badge page
+    Output: dict. A dictionary where keys are badge titles and values are badge classes
+    """
+
+    # Every line holding a course name contains a colon; superfluous characters such
+    # as "\xa0", "/as", "/a" or tabs are removed while parsing.
+    all_classes = []
+    for content in contents:
+        courses = [parse_course(line) for line in content.split('\n') if ":" in line]
+        all_classes.append([course for course in courses if course is not None])
 
-    badge_titles = [title.text.strip()[7:] for title in badges]
+    # All badge titles begin with 'Badge: ', which is omitted
+    badge_titles = [title.strip()[7:] for title in titles]
 
     # Create a dictionary where keys are badge titles and values are list of
     # classes in the badge.
     return dict(zip(badge_titles, all_classes))
 
 
-def stem(badges):
+def extract_ges_fast(content, an_url=None):
+    """Extract the GE courses straight from the raw catalog page without building a
+    parse tree, falling back to BeautifulSoup if the page does not pass the checks
+
+    Input:  bytes. Raw contents of the catalog page
+            string. URL of the page, to attribute the parse to it in the trace
+    Output: dict. A dictionary where keys are GE areas of study and values are GE classes
+    """
+
+    with tracing.page(an_url):
+        scanned = fastpath.scan_ges(content)
+        if scanned is not None and fastpath.valid(scanned[0]):
+            ge_classes = ges_from_text(*scanned)
+            if ge_classes and len(ge_classes) == len(scanned[1]) - 1:
+                return ge_classes
+
+        return extract_ges(make_soup(content, ge_targets))
+
+
+def extract_badges_fast(pages, urls=None):
+    """Extract the badge courses straight from the raw badge pages without building
+    parse trees, falling back to BeautifulSoup if any page does not pass the checks
+
+    Input:  list. Raw contents of the badge pages
+            list. URLs of the badge pages, to attribute the parses to them in the trace
+    Output: dict. A dictionary where keys are badge titles and values are badge classes
+    """
+
+    scanned = []
+    for an_url, page in zip(urls or [None] * len(pages), pages):
+        with tracing.page(an_url):
+            scanned.append(fastpath.scan_badge(page))
+    if scanned and all(scanned) and all(
+            title.strip().startswith('Badge')
+            and fastpath.valid([line for line in contents.split('\n') if ":" in line])
+            for title, contents in scanned):
+        badge_classes = badges_from_text(*zip(*scanned))
+        if len(badge_classes) == len(pages):
+            return badge_classes
+
+    return extract_badges(badge_soups(pages, urls))
+
+
+def extract_program(content, key=None):
+    """Extract the title and the courses of a catalog program page, straight from the
+    raw page if it passes the checks, else with BeautifulSoup
+
+    Input:  bytes. Raw contents of the program page
+            string. URL or key of the page, to attribute the parse to it in the trace
+    Output: tuple. The program title and the list of its distinct courses, or None if
+        the page is not a program page
+    """
+
+    with tracing.page(key):
+        scanned = fastpath.scan_program(content)
+        if scanned is not None:
+            title, texts = scanned
+        else:
+            soup = make_soup(content, program_targets)
+            heading = soup.find('h1', id='acalog-content')
+            if heading is None:
+                return None
+            title = heading.text
+            texts = [course.text for course in soup.find_all('a', href='#')]
+
+    courses = dict.fromkeys(course for course in map(parse_course, texts)
+                            if course is not None)
+
+    return title.strip(), list(courses)
+
+
+def name_programs(extracted):
+    """Key the extracted programs by their titles, adding the program id to a title
+    shared by several programs
+
+    Input: dict. Program ids as keys and extract_program() results as values
+    Output: dict. Program titles as keys and lists of courses as values
+    """
+
+    extracted = {poid: program for poid, program in extracted.items()
+                 if program is not None}
+    counts = {}
+    for title, _ in extracted.values():
+        counts[title] = counts.get(title, 0) + 1
+
+    return {(title if counts[title] == 1 else f'{title} ({poid})'): courses
+            for poid, (title, courses) in extracted.items()}
+
+
+def program_overlap(programs, badges):
+    """Cross-reference the courses of every program with the badges
+
+    Input:  dict. Program titles as keys and lists of courses as values
+            dict. Badge titles as keys and lists of badge classes as values
+    Output: tuple. The program x badge matrix, with the number of courses of every
+        program in every badge and the number of badges a program covers, and the
+        list of those courses; both as dicts of columns
+    """
+
+    badge_codes = {badge: {course.code for course in courses}
+                   for badge, courses in badges.items()}
+
+    matrix = {'Program': [], 'Courses': [], **{badge: [] for badge in badges},
+              'Badges covered': []}
+    listing = {'Program': [], 'Badge': [], 'Course': []}
+    for program, courses in programs.items():
+        matrix['Program'].append(program)
+        matrix['Courses'].append(len(courses))
+        covered = 0
+        for badge, codes in badge_codes.items():
+            in_badge = [course for course in courses if course.code in codes]
+            matrix[badge].append(len(in_badge))
+            covered += bool(in_badge)
+            for course in in_badge:
+                listing['Program'].append(program)
+                listing['Badge'].append(badge)
+                listing['Course'].append(str(course))
+        matrix['Badges covered'].append(covered)
+
+    return matrix, listing
+
+
+def course_index(ges, badges):
+    """Create an index of every course keyed by its course code, recording the GE areas
+    and badges it belongs to. Built once per run and shared by in_or_not, stem and
+    badge_matrix so that every membership test is a single dictionary lookup.
+
+    Input: two dicts. 2 dictionaries containing ge areas of study and their courses
+        and badge titles and their classes
+    Output: dict. Course code -> {'course': Course, 'areas': set of GE areas,
+        'badges': set of badges}
+    """
+
+    index = {}
+    for kind, groups in (('areas', ges), ('badges', badges)):
+        for group, courses in groups.items():
+            for course in courses:
+                entry = index.setdefault(course.code,
+                                         {'course': course, 'areas': set(), 'badges': set()})
+                entry[kind].add(group)
+
+    return index
+
+
+def classify(courses, groups):
+    """Sort courses into named groups of departments in a single pass. A course belongs
+    to a group when its department is exactly one of the group's departments.
+
+    Input:  list. Course records
+            dict. Group names as keys and (column title, list of departments) as values,
+                see department_groups
+    Output: dict. Group names as keys and {column title: list of courses} as values;
+        courses are ordered by the group's department order, then by course number
+    """
+
+    # Department -> [(group, position of the department in the group)]
+    by_dept = {}
+    for name, (_, depts) in groups.items():
+        for pos, dept in enumerate(depts):
+            by_dept.setdefault(dept, []).append((name, pos))
+
+    members = {name: [] for name in groups}
+    for course in courses:
+        for name, pos in by_dept.get(course.dept, ()):
+            members[name].append((pos, course))
+
+    return {name: {groups[name][0]: [course for _, course in sorted(members[name])]}
+            for name in groups}
+
+
+def group_courses(badges, groups=None):
+    """List the badge courses of every department group
+
+    Input:  dict. Dictionary containing badge titles and their classes
+            dict. Department groups (defaults to department_groups)
+    Output: dict. Group names as keys and lists of courses as values
+    """
+
+    if groups is None:
+        groups = department_groups
+
+    badge_courses = [entry['course'] for entry in course_index({}, badges).values()]
+    classified = classify(badge_courses, groups)
+
+    return {name: members[groups[name][0]] for name, members in classified.items()}
+
+
+def stem(badges, index=None):
     """Create a dictionary where all badge classes are filtered for STEM general education
     classes.
 
-    Input: dict. Dictionary containing badge titles and their classes
+    Input:  dict. Dictionary containing badge titles and their classes
+            dict. Optional course index from course_index()
     Output: dict.
     """
 
-    prefixes = ['BIO ', 'BIOE ', 'CHEM ', 'CSE ', 'ENGR ',
-                'ENVE ', 'ESS ', 'MATH ', 'ME ', 'MSE ', 'PHYS ']
-
-    flat_badges = sorted(
-        list(set([course for badge in badges.values() for course in badge])))
+    if index is None:
+        index = course_index({}, badges)
 
-    stem_courses = []
-    for prefix in prefixes:
-        for badge in flat_badges:
-            if prefix in badge:
-                stem_courses.append(badge)
+    badge_courses = [entry['course'] for entry in index.values() if entry['badges']]
 
-    return {'Engineering Majors / 11 Intellectual Badges': stem_courses}
+    return classify(badge_courses, {'STEM': department_groups['STEM']})['STEM']
 
 
-def in_or_not(ges, badges):
+def in_or_not(ges, badges, index=None):
     """Create a two pandas dataframes of general education courses in or not in the
     badges list of courses.
 
-    Input: two dicts. 2 dictionaries containing ge areas of study and their courses
-        and badge titles and their classes
+    Input:  two dicts. 2 dictionaries containing ge areas of study and their courses
+                and badge titles and their classes
+            dict. Optional course index from course_index()
     Output: two pandas dataframes
     """
 
-    # Flatten lists in badges:
-    flat_badges = sorted(
-        list(set([ele for sub_lst in badges.values() for ele in sub_lst])))
+    if index is None:
+        index = course_index(ges, badges)
 
     yes_dict, no_dict = {}, {}
     for area, courses in ges.items():
         yes_lst, no_lst = [], []
 
         for ge in courses:
-            if ge in flat_badges:
+            if index[ge.code]['badges']:
                 yes_lst.append(ge)
             else:
                 no_lst.append(ge)
@@ -192,23 +500,83 @@ def in_or_not(ges, badges):
     return yes_dict, no_dict
 
 
-def xref(courses, badges):
+def badge_matrix(badges, index=None):
+    """Create a course by badge membership matrix where a 1 marks a course listed in a
+    badge. It is built once and shared by every cross-reference table.
+
+    Input:  dict. Dictionary containing badges as keys and lists of classes as values.
+            dict. Optional course index from course_index()
+    Output: pandas dataframe. uint8 matrix indexed by course code with one column per
+        badge
+    """
+
+    if index is None:
+        index = course_index({}, badges)
+
+    codes = [code for code, entry in index.items() if entry['badges']]
+    columns = {badge: col for col, badge in enumerate(badges)}
+    matrix = np.zeros((len(codes), len(badges)), dtype=np.uint8)
+    for row, code in enumerate(codes):
+        for badge in index[code]['badges']:
+            matrix[row, columns[badge]] = 1
+
+    return pd.DataFrame(matrix, index=pd.Index(codes), columns=list(badges))
+
+
+def xref_table(courses, badges, matrix=None):
+    """Create the cross-reference table of xref as plain columns rather than a DataFrame
+
+    Input:  dict. Dictionary containing an area of study as key and its classes as value
+            dict. Dictionary containing badges as keys and lists of classes as values.
+            pandas dataframe. Optional membership matrix from badge_matrix(badges)
+    Output: dict. Column names as keys and lists of values as values
+    """
+
+    if matrix is None:
+        matrix = badge_matrix(badges)
+
+    table = as_table(courses)
+
+    # Look up the rows of the classes in the matrix; classes in no badge get all 0s
+    rows = matrix.reindex([course.code for course in courses[list(courses)[-1]]],
+                          fill_value=0)
+    for badge in badges:
+        table[badge] = rows[badge].tolist()
+
+    return table
+
+
+def xref(courses, badges, matrix=None):
     """Create a boolean dictionary to represent classes in an area of study that is present in
     a dictionary containing badges as keys and a list of their badge classes as values.
 
     Input:  list. List of classes
             dict. Dictionary containing badges as keys and lists of classes as values.
+            pandas dataframe. Optional membership matrix from badge_matrix(badges)
     Output: boolean dictionary
     """
 
-    keys = [str(k) for k in courses]
-    bool_dict = courses
-    for badge in badges:
-        for k in keys:
-            bool_dict[badge] = [1 if val in badges[badge]
-                                else 0 for val in courses[k]]
+    return create_dfs(xref_table(courses, badges, matrix))
+
+
+def as_text(values):
+    """Convert course records to their text so that they can be written to a workbook
+
+    Input: list. Course records (other values are left untouched)
+    Output: list
+    """
+
+    return [str(value) if isinstance(value, Course) else value for value in values]
 
-    return pd.DataFrame.from_dict({key: pd.Series(value) for key, value in bool_dict.items()})
+
+def as_table(a_dict):
+    """Convert a dictionary of course lists to a table of text columns
+
+    Input: dict
+    Output: dict. Column names as keys and lists of values as values
+    """
+
+    return {key: as_text(value) for key, value in a_dict.items()}
 
 
 def create_dfs(a_dict):
@@ -218,50 +586,370 @@ def create_dfs(a_dict):
     Output: pandas dataframe
     """
     return pd.DataFrame.from_dict(
-        {key: pd.Series(value) for key, value in a_dict.items()})
+        {key: pd.Series(as_text(value)) for key, value in a_dict.items()})
 
 
-if __name__ == "__main__":
+def cross_reference(ge_classes, badge_classes, groups=None):
+    """Create every table of the workbook from the extracted GE and badge classes
+
+    Input:  dict. GE areas of study and their classes, from extract_ges
+            dict. Badge titles and their classes, from extract_badges
+            dict. Department groups to cross-reference (defaults to department_groups)
+    Output: dict. Sheet names as keys and tables (column name -> list of values) as
+        values, in workbook order; create_dfs turns a table into a DataFrame
+    """
+
+    if groups is None:
+        groups = department_groups
 
-    # DF for GE CLASSES
-    ge_soup = scrape_parse(ge_url)
-    ge_classes = extract_ges(ge_soup)
-    ges_df = create_dfs(ge_classes)
-    # print(ges_df)
-
-    # DF for BADGE CLASSES
-    b_links = badge_links(badge_url)
-    badge_classes = extract_badges(b_links)
-    badges_df = create_dfs(badge_classes)
-    # print(badges_df)
-
-    # DF for IN, NOT IN BADGES
-    in_dict, not_dict = in_or_not(ge_classes, badge_classes)
-    in_df = create_dfs(in_dict)
-    not_df = create_dfs(not_dict)
-    # print(in_df)
-    # print(not_df)
-
-    # DF for XREFFING STEM and BADGES
-    stem_dict = stem(badge_classes)
-    stem_df = xref(stem_dict, badge_classes)
-    # print(stem_df)
-
-    # DF for XREFFING GEs and BADGES
-    keys = [str(k)[:-8] for k in ge_classes]
-    results = []
+    sheets = {}
+
+    # XREFFING GEs and BADGES
+    with span('course_index'):
+        index = course_index(ge_classes, badge_classes)
+        matrix = badge_matrix(badge_classes, index)
     for area, ge in ge_classes.items():
-        results.append(xref({area: ge}, badge_classes))
-    # print(results)
+        with span('xref', sheet=area):
+            sheets[f'{str(area)[:-8]} vs Badges'] = xref_table({area: ge}, badge_classes,
+                                                               matrix)
+
+    # XREFFING DEPARTMENT GROUPS (e.g. STEM) and BADGES
+    with span('classify'):
+        badge_courses = [entry['course'] for entry in index.values() if entry['badges']]
+        classified = classify(badge_courses, groups)
+    for name, group in classified.items():
+        with span('xref', sheet=name):
+            sheets[f'{name} vs Badges'] = xref_table(group, badge_classes, matrix)
+
+    # GE CLASSES and BADGE CLASSES
+    sheets['GE Courses'] = as_table(ge_classes)
+    sheets['Badge Courses'] = as_table(badge_classes)
+
+    # IN, NOT IN BADGES
+    with span('in_or_not'):
+        in_dict, not_dict = in_or_not(ge_classes, badge_classes, index)
+    sheets['In Badges'] = as_table(in_dict)
+    sheets['NOT In Badges'] = as_table(not_dict)
+
+    return sheets
+
+
+def catalog_history(ge_by_year, badge_classes):
+    """Combine the GE classes of several catalog years into one year-keyed table
+
+    Input:  dict. Catalog years as keys and GE classes (from extract_ges) as values
+            dict. Badge titles and their classes, from extract_badges
+    Output: dict. Table with one row per year, area of study and course, recording
+        whether the course is listed in a badge
+    """
+
+    badge_codes = {course.code for courses in badge_classes.values() for course in courses}
+
+    table = {'Year': [], 'Area of study': [], 'Course': [], 'In Badges': []}
+    for year, ge_classes in ge_by_year.items():
+        for area, courses in ge_classes.items():
+            for course in courses:
+                table['Year'].append(year)
+                table['Area of study'].append(area)
+                table['Course'].append(str(course))
+                table['In Badges'].append(int(course.code in badge_codes))
+
+    return table
+
+
+def year_path(path, year):
+    """Insert a catalog year into a file name, e.g. data/catalog-2019.arrow
+
+    Input:  string. Path
+            string. Catalog year
+    Output: string. Path
+    """
 
-    # Export to Excel
-    with pd.ExcelWriter("data/CrossReferenceGE-Badges.xlsx") as writer:
+    root, ext = os.path.splitext(path)
 
-        for idx in range(len(keys)):
-            results[idx].to_excel(writer, sheet_name=f'{keys[idx]} vs Badges')
+    return f'{root}-{year}{ext}'
 
-        stem_df.to_excel(writer, sheet_name="STEM vs Badges")
-        ges_df.to_excel(writer, sheet_name="GE Courses")
-        badges_df.to_excel(writer, sheet_name="Badge Courses")
-        in_df.to_excel(writer, sheet_name="In Badges")
-        not_df.to_excel(writer, sheet_name="NOT In Badges")
+
+def parse_args(argv=None):
+    """Parse the command line options of the scraper
+
+    Input: list. Command line arguments (defaults to sys.argv)
+    Output: argparse.Namespace
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Cross-reference GE courses with the Intellectual Experience Badges.')
+    parser.add_argument('--year', action='append', default=[],
+                        help='catalog year to scrape, may be repeated (default: the '
+                             f'latest); known years: {", ".join(catalogs)}')
+    parser.add_argument('--catalog', action='append', default=[],
+                        metavar='YEAR=CATOID:POID',
+                        help='scrape the GE page of another catalog year, e.g. '
+                             "'2021=18:2310'; may be repeated")
+    parser.add_argument('--programs', metavar='URL',
+                        help='also crawl every program page this catalog page links to '
+                             '(e.g. the acalog list of programs) and cross-reference the '
+                             'courses of every program with the badges')
+    parser.add_argument('--ranked', type=int, metavar='K',
+                        help="add a 'Courses in K+ Badges' sheet ranking the courses in "
+                             'at least K badges by their number of badges')
+    parser.add_argument('--workers', type=int, default=fetch_layer.max_workers,
+                        help='number of pages fetched at the same time')
+    parser.add_argument('--timeout', type=float, default=fetch_layer.timeout,
+                        help='seconds to wait for a server to connect or answer')
+    parser.add_argument('--retries', type=int, default=fetch_layer.retries,
+                        help='number of retries of a failed request')
+    parser.add_argument('--per-host', type=int, default=fetch_layer.per_host,
+                        help='number of requests sent to one host at the same time '
+                             '(default: as many as the workers)')
+    parser.add_argument('--rate', type=float, default=fetch_layer.rate,
+                        help='requests per second sent to one host, 0 for no limit')
+    parser.add_argument('--cache-dir', default='data/.cache',
+                        help='directory of the on-disk HTTP cache')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always download every page')
+    parser.add_argument('--max-age', type=float, default=0,
+                        help='seconds a cached page is used without revalidating it')
+    parser.add_argument('--offline', action='store_true',
+                        help='only use cached pages, never touch the network')
+    parser.add_argument('--cache-size', type=float, default=50,
+                        help='maximum size of the cache in megabytes')
+    parser.add_argument('--record', metavar='ARCHIVE',
+                        help='append every fetched page to a page archive')
+    parser.add_argument('--replay', metavar='ARCHIVE',
+                        help='serve every page from a page archive instead of the network')
+    parser.add_argument('--mirror', metavar='URL',
+                        help='send requests to a stand-in server (see archive.py serve)')
+    parser.add_argument('--parser', default='auto',
+                        help="HTML parser backend, e.g. 'lxml' or 'html.parser' "
+                             "(default: fastest installed)")
+    parser.add_argument('--no-fast-path', action='store_true',
+                        help='always extract courses through BeautifulSoup')
+    parser.add_argument('--group', action='append', default=[], metavar='NAME=DEPTS',
+                        help="add a '<NAME> vs Badges' sheet for a comma separated list "
+                             "of departments, e.g. 'Natural Sciences=BIO,CHEM,PHYS'")
+    parser.add_argument('--output', default='data/CrossReferenceGE-Badges',
+                        help='output path without extension; the workbook is written to '
+                             '<OUTPUT>.xlsx, other formats to files in <OUTPUT>/')
+    parser.add_argument('--format', action='append', choices=output_formats,
+                        help='output format, may be repeated (default: xlsx)')
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help='save the extracted courses as an Arrow snapshot')
+    parser.add_argument('--from-snapshot', metavar='PATH',
+                        help='skip fetching and extracting; load the courses from an '
+                             'Arrow snapshot instead')
+    parser.add_argument('--index', metavar='PATH',
+                        help='write the lookup index used by query.py, e.g. '
+                             'data/index.json')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='save the fetches and the time of every stage as JSON')
+    parser.add_argument('--chrome-trace', metavar='PATH',
+                        help='save the trace in the Chrome trace event format')
+    parser.add_argument('--profile', action='store_true',
+                        help='also record allocation peaks, and print where the time '
+                             'went')
+    parser.add_argument('--state-dir', default='data/.pipeline',
+                        help='directory of the saved stage outputs')
+    parser.add_argument('--force', action='store_true',
+                        help='recompute every stage even if its inputs are unchanged')
+
+    args = parser.parse_args(argv)
+
+    # Check the department groups now rather than when the workbook is written
+    groups = []
+    for group in args.group:
+        name, _, depts = group.partition('=')
+        name, depts = name.strip(), [dept for dept in depts.replace(' ', '').split(',')
+                                     if dept]
+        if not name or not depts:
+            parser.error(f"--group {group!r}: expected NAME=DEPTS, e.g. "
+                         f"'Natural Sciences=BIO,CHEM,PHYS'")
+        sheet = f'{name} vs Badges'
+        if len(sheet) > 31 or any(char in sheet for char in '[]:*?/\\'):
+            parser.error(f"--group {group!r}: the sheet name {sheet!r} must be at most "
+                         f"31 characters and cannot contain any of [ ] : * ? / \\")
+        groups.append((name, depts))
+    args.group = groups
+
+    return args
+
+
+if __name__ == "__main__":
+
+    args = parse_args()
+    if args.trace or args.chrome_trace or args.profile:
+        tracing.start(memory=args.profile)
+    fetch_layer.configure(workers=args.workers, a_timeout=args.timeout,
+                          a_retries=args.retries, a_per_host=args.per_host,
+                          a_rate=args.rate)
+    set_parser(args.parser)
+    for catalog in args.catalog:
+        year, _, ids = catalog.partition('=')
+        catoid, _, poid = ids.partition(':')
+        catalogs[year] = (int(catoid), int(poid))
+        args.year.append(year)
+    years = sorted(set(args.year)) or [max(catalogs)]
+    for year in years:
+        if year not in catalogs:
+            raise SystemExit(f'Unknown catalog year {year}; use --catalog {year}=CATOID:POID')
+    for name, depts in args.group:
+        department_groups[name] = (f'{name} Courses', depts)
+    if not args.no_cache:
+        fetch_layer.set_cache(DiskCache(args.cache_dir, max_age=args.max_age,
+                                        offline=args.offline,
+                                        max_bytes=int(args.cache_size * 2**20)))
+    recorder = ArchiveWriter(args.record) if args.record else None
+    replay = ArchiveReader(args.replay) if args.replay else None
+    fetch_layer.set_archive(recorder, replay, args.mirror)
+
+    try:
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        pipeline = Pipeline(args.state_dir, force=args.force, code_digest=source_digest(
+            [os.path.join(src_dir, name)
+             for name in ('scrape.py', 'course.py', 'diff.py', 'export.py', 'fastpath.py',
+                          'masks.py', 'parsers.py', 'query.py', 'snapshot.py')]))
+
+        ge_by_year, ges_keys = {}, {}
+        if args.from_snapshot:
+            # LOAD GE CLASSES and BADGE CLASSES from a snapshot
+            with open(args.from_snapshot, 'rb') as f:
+                ges_key = badges_key = digest(f.read())
+            ge_classes, badge_classes = load_snapshot(args.from_snapshot)
+            ge_by_year[years[-1]], ges_keys[years[-1]] = ge_classes, ges_key
+        else:
+            # FETCH the GE page of every catalog year and the badge pages. The GE pages
+            # of all years are fetched concurrently over the shared session. Pages that
+            # cannot be fetched are left out and reported at the end of the run.
+            with span('fetch', 'stage'):
+                try:
+                    ge_pages = dict(zip(years, fetch_all([catalog_url(*catalogs[year])
+                                                          for year in years],
+                                                         skip_failed=True)))
+                    pages = badge_pages(badge_url, skip_failed=True)
+                except FetchError as e:
+                    raise SystemExit(f'Cannot fetch the badge index: {e}')
+            page_urls, pages = list(pages), list(pages.values())
+            ge_pages = {year: page for year, page in ge_pages.items() if page is not None}
+            if not ge_pages:
+                raise SystemExit('Cannot fetch the GE page of any catalog year: '
+                                 + '; '.join(f'{url}: {reason}'
+                                             for url, reason in fetch_layer.failed
+                                             if 'preview_program.php' in url))
+            years = list(ge_pages)
+
+            # EXTRACT GE CLASSES of every year and BADGE CLASSES
+            if args.no_fast_path:
+                mode = f'soup:{parsers.parser}'
+                for year, ge_page in ge_pages.items():
+                    with tracing.page(catalog_url(*catalogs[year])):
+                        ge_by_year[year], ges_keys[year] = pipeline.stage(
+                            f'extract_ges_{year}', [mode, digest(ge_page)],
+                            lambda page: extract_ges(make_soup(page, ge_targets)), ge_page)
+                badge_classes, badges_key = pipeline.stage(
+                    'extract_badges', [mode, *map(digest, pages)],
+                    lambda: extract_badges(badge_soups(pages, page_urls)))
+            else:
+                for year, ge_page in ge_pages.items():
+                    ge_by_year[year], ges_keys[year] = pipeline.stage(
+                        f'extract_ges_{year}', ['fast', digest(ge_page)],
+                        extract_ges_fast, ge_page, catalog_url(*catalogs[year]))
+                badge_classes, badges_key = pipeline.stage(
+                    'extract_badges', ['fast', *map(digest, pages)],
+                    extract_badges_fast, pages, page_urls)
+
+            # The workbook cross-references the latest of the catalog years
+            ge_classes, ges_key = ge_by_year[years[-1]], ges_keys[years[-1]]
+
+            if args.snapshot:
+                for year in years:
+                    path = (args.snapshot if len(years) == 1
+                            else year_path(args.snapshot, year))
+                    pipeline.stage(f'snapshot_{year}', [ges_keys[year], badges_key, path],
+                                   save_snapshot, ge_by_year[year], badge_classes, path,
+                                   catalog_url(*catalogs[year]), outputs=[path])
+
+        if args.index:
+            pipeline.stage('index',
+                           [ges_key, badges_key, repr(department_groups), args.index],
+                           write_index, ge_classes, badge_classes, args.index,
+                           args.from_snapshot or catalog_url(*catalogs[years[-1]]),
+                           group_courses(badge_classes), outputs=[args.index])
+
+        # CROSS-REFERENCE GEs, DEPARTMENT GROUPS and BADGES
+        sheets, sheets_key = pipeline.stage(
+            'cross_reference', [ges_key, badges_key, repr(department_groups)],
+            cross_reference, ge_classes, badge_classes)
+
+        # RANK the courses in at least K badges
+        if args.ranked is not None:
+            ranked, ranked_key = pipeline.stage('ranked_courses',
+                                                [ges_key, badges_key, str(args.ranked)],
+                                                ranked_courses, ge_classes, badge_classes,
+                                                args.ranked)
+            sheets = {**sheets, f'Courses in {args.ranked}+ Badges': ranked}
+            sheets_key = digest(sheets_key, ranked_key)
+
+        # COMBINE the GE classes of every catalog year and list the changes between years
+        if len(ge_by_year) > 1:
+            history, history_key = pipeline.stage(
+                'catalog_history', [*ges_keys.values(), badges_key],
+                catalog_history, ge_by_year, badge_classes)
+            changes, changes_key = pipeline.stage(
+                'catalog_changes', list(ges_keys.values()),
+                lambda: changes_table(diff_history(
+                    {year: (ge_classes, {}) for year, ge_classes in ge_by_year.items()})))
+            sheets = {**sheets, 'GE Courses by Year': history,
+                      'GE Changes by Year': changes}
+            sheets_key = digest(sheets_key, history_key, changes_key)
+
+        # CRAWL every program of the catalog and CROSS-REFERENCE its courses with BADGES.
+        # Only the program pages that changed since the last run are extracted again.
+        if args.programs:
+            with span('fetch_programs', 'stage'):
+                try:
+                    program_contents = program_pages(args.programs, skip_failed=True)
+                except FetchError as e:
+                    raise SystemExit(f'Cannot fetch the list of programs: {e}')
+            extracted, programs_key = pipeline.map(
+                'extract_programs',
+                [(digest(page), (page, f'poid={poid}'))
+                 for poid, page in program_contents.items()],
+                lambda arg: extract_program(*arg))
+            (matrix, listing), overlap_key = pipeline.stage(
+                'program_overlap',
+                [programs_key, repr(list(program_contents)), badges_key],
+                lambda: program_overlap(
+                    name_programs(dict(zip(program_contents, extracted))), badge_classes))
+            sheets = {**sheets, 'Programs vs Badges': matrix,
+                      'Program Badge Courses': listing}
+            sheets_key = digest(sheets_key, overlap_key)
+    finally:
+        # Every page has been fetched, or the run stopped: write the archive index
+        if recorder is not None:
+            recorder.close()
+
+    # Export to Excel and the other requested formats
+    formats = args.format or ['xlsx']
+    output = args.output[:-len('.xlsx')] if args.output.endswith('.xlsx') else args.output
+    outputs = [f'{output}.xlsx' if fmt == 'xlsx' else output for fmt in formats]
+    pipeline.stage('export', [sheets_key, output, *formats], export, sheets, output,
+                   formats, outputs=outputs)
+
+    print(f"Stages run: {', '.join(pipeline.ran) or 'none'}; "
+          f"reused: {', '.join(pipeline.reused) or 'none'}")
+
+    tracer = tracing.stop()
+    if tracer is not None:
+        if args.trace:
+            tracing.write_trace(tracer, args.trace)
+        if args.chrome_trace:
+            tracing.write_chrome_trace(tracer, args.chrome_trace)
+        if args.profile:
+            tracing.report(tracer)
+
+    if fetch_layer.failed:
+        print(f'{len(fetch_layer.failed)} pages could not be fetched and were left out:',
+              file=sys.stderr)
+        for url, reason in fetch_layer.failed:
+            print(f'  {url}: {reason}', file=sys.stderr)
+        sys.exit(1)
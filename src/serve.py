@@ -0,0 +1,254 @@
+'''
+Read-only HTTP/JSON service for cross-reference lookups.
+
+The service loads the lookup index written by scrape.py --index (see query.py) once
+and answers from it in memory:
+
+    GET /courses/ANTH%20001                 GE areas and badges of a course
+    GET /badges                             every badge
+    GET /badges/Ethics                      courses of a badge
+    GET /areas                              every GE area
+    GET /areas/Social%20Science%20Courses   courses of a GE area
+    GET /overlap?area=Arts&badge=Ethics     courses in all the given areas and badges
+    GET /groups/STEM                        badge courses of a department group
+    GET /health                             catalog, index creation time and reloads
+
+Area, badge and group names match as in query.py: exactly ignoring case, else on a
+unique part of the name. Composite /overlap queries go through an LRU cache that is
+cleared whenever the index changes. The index file is polled for changes and
+reloaded in the background, so a new scrape is picked up without a restart.
+
+    python src/scrape.py --index data/index.json
+    python src/serve.py --index data/index.json --port 8080
+'''
+
+
+import argparse
+import asyncio
+from functools import lru_cache
+import json
+import os
+import sys
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import query
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class LookupService:
+    """Answers lookups from a lookup index, reloading it when the file changes
+
+    Input:  string. Path of the lookup index
+            int. Number of composite query results kept in the LRU cache
+    """
+
+    def __init__(self, index_path, cache_size=1024):
+        self.index_path = index_path
+        self.reloads = 0
+        self._mtime = None
+        self._broken_mtime = None
+        self.index = None
+        self.overlap = lru_cache(maxsize=cache_size)(self._overlap)
+        self.reload()
+
+    def reload(self):
+        """Load the index again if the file changed since it was last loaded
+
+        Input: None
+        Output: bool. Whether the index was loaded
+        """
+
+        return self.install(self.read())
+
+    def read(self):
+        """Read the index if the file changed since it was last loaded. Safe to call
+        from another thread: the index in service is left untouched. A file that
+        could not be loaded is not read again until it changes.
+
+        Input: None
+        Output: tuple. The index and the modification time of its file, or None if
+            the file is unchanged
+        """
+
+        mtime = os.stat(self.index_path).st_mtime_ns
+        if mtime in (self._mtime, self._broken_mtime):
+            return None
+
+        try:
+            return query.load_index(self.index_path), mtime
+        except (OSError, ValueError):
+            self._broken_mtime = mtime
+            raise
+
+    def install(self, loaded):
+        """Put an index read by read() in service and drop the cached results of the
+        previous one. Must run on the thread answering the requests.
+
+        Input: tuple. The index and the modification time of its file, or None
+        Output: bool. Whether a new index was put in service
+        """
+
+        if loaded is None:
+            return False
+
+        self.index, self._mtime = loaded
+        self.overlap.cache_clear()
+        self.reloads += 1
+
+        return True
+
+    def _overlap(self, areas, badges):
+        return query.lookup_groups(self.index, areas, badges)
+
+    def handle(self, path):
+        """Answer a request
+
+        Input: string. Request path with its query string
+        Output: tuple. HTTP status and a JSON-serializable body
+        """
+
+        index = self.index
+        url = urlsplit(path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        resource, name = parts[0], '/'.join(parts[1:])
+
+        try:
+            if resource == 'courses' and name:
+                return 200, query.lookup_course(index, name)
+            if resource in ('areas', 'badges') and not name:
+                return 200, {resource: {group: len(codes)
+                                        for group, codes in index[resource].items()}}
+            if resource == 'areas':
+                return 200, self.overlap((name,), ())
+            if resource == 'badges':
+                return 200, self.overlap((), (name,))
+            if resource == 'overlap':
+                params = parse_qs(url.query)
+                areas, badges = params.get('area', []), params.get('badge', [])
+                if not (areas or badges):
+                    return 400, {'error': 'give at least one area or badge'}
+                return 200, self.overlap(tuple(areas), tuple(badges))
+            if resource == 'groups':
+                group = query.find_group(index.get('groups', {}), name)
+                return 200, {'group': group, 'courses': [
+                    {'course': code, 'title': index['courses'][code]['title']}
+                    for code in index['groups'][group]]}
+            if resource == 'health':
+                return 200, {'catalog': index['catalog'], 'created': index['created'],
+                             'courses': len(index['courses']), 'reloads': self.reloads,
+                             'cache': self.overlap.cache_info()._asdict()}
+        except KeyError as e:
+            return 404, {'error': e.args[0]}
+
+        return 404, {'error': f'no resource {url.path!r}'}
+
+
+def _response(status, body, keep_alive=True, head=False):
+    payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    headers = [f'HTTP/1.1 {status} {_REASONS[status]}',
+               'Content-Type: application/json; charset=utf-8',
+               f'Content-Length: {len(payload)}',
+               f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + (b'' if head else payload)
+
+
+async def _handle_connection(service, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip().lower()
+
+            try:
+                method, path, version = request_line.decode('latin-1').split()
+            except ValueError:
+                writer.write(_response(400, {'error': 'malformed request'}, False))
+                break
+
+            keep_alive = (headers.get('connection') != 'close'
+                          if version == 'HTTP/1.1' else headers.get('connection') == 'keep-alive')
+            if method not in ('GET', 'HEAD'):
+                status, body = 405, {'error': f'{method} is not supported'}
+            else:
+                try:
+                    status, body = service.handle(path)
+                except Exception as e:      # keep serving the other requests
+                    status, body = 500, {'error': repr(e)}
+            writer.write(_response(status, body, keep_alive, method == 'HEAD'))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _watch(service, interval):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if service.install(await loop.run_in_executor(None, service.read)):
+                print(f'Reloaded {service.index_path}', file=sys.stderr)
+        except (OSError, ValueError) as e:
+            # A half-written or missing index keeps the previous one in service
+            print(f'Not reloading {service.index_path}: {e}', file=sys.stderr)
+
+
+async def serve(service, host='127.0.0.1', port=8080, reload_interval=2.0):
+    """Serve lookups until cancelled
+
+    Input:  LookupService. The service answering the requests
+            string. Host to listen on
+            int. Port to listen on, 0 for any free port
+            float. Seconds between checks for a new index, 0 to never reload
+    Output: None
+    """
+
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_connection(service, reader, writer), host, port)
+    host, port = server.sockets[0].getsockname()[:2]
+    print(f'Serving {service.index_path} on http://{host}:{port}', flush=True)
+
+    watcher = asyncio.create_task(_watch(service, reload_interval)) \
+        if reload_interval > 0 else None
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Serve GE and badge lookups over HTTP.')
+    parser.add_argument('--index', default=query.default_index,
+                        help=f'lookup index written by scrape.py --index '
+                             f'(default: {query.default_index})')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='port to listen on, 0 for any free port')
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='number of composite query results kept in memory')
+    parser.add_argument('--reload-interval', type=float, default=2.0,
+                        help='seconds between checks for a new index, 0 to never reload')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(LookupService(args.index, args.cache_size),
+                          args.host, args.port, args.reload_interval))
+    except KeyboardInterrupt:
+        pass
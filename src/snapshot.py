@@ -0,0 +1,157 @@
+'''
+Columnar snapshot of the scraped catalog.
+
+The GE areas, the badges and the courses listed in each of them are saved as a single
+Arrow IPC file with one row per (group, course) membership. The file is uncompressed so
+that it can be memory-mapped: loading it reads no more than the columns and does not
+need the network, BeautifulSoup or pandas. The loader hands back the same dicts that
+extract_ges and extract_badges produce, which scrape.cross_reference / scrape.xref turn
+into the workbook tables.
+
+    python src/scrape.py --snapshot data/catalog.arrow
+    python src/snapshot.py data/catalog.arrow
+
+Schema (version 1):
+    kind      dictionary<string>  'area' or 'badge'
+    group     dictionary<string>  GE area of study or badge title
+    position  int32               position of the course within its group
+    code      string              course code, e.g. 'SPAN 050'
+    title     string              course title
+The schema metadata records the snapshot version and the order of the groups, so that
+groups without courses survive a round trip.
+'''
+
+
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import time
+
+from course import parse_course
+
+
+snapshot_version = 1
+
+
+def save_snapshot(ges, badges, path, catalog=None):
+    """Save the extracted GE and badge classes as an Arrow snapshot
+
+    Input:  dict. GE areas of study and their classes, from extract_ges
+            dict. Badge titles and their classes, from extract_badges
+            string. Path of the snapshot
+            string. Optional label of the catalog, e.g. its year or URL
+    Output: string. Path of the snapshot
+    """
+
+    import pyarrow as pa
+
+    kinds, groups, positions, codes, titles = [], [], [], [], []
+    for kind, group_dict in (('area', ges), ('badge', badges)):
+        for group, courses in group_dict.items():
+            for pos, course in enumerate(courses):
+                course = parse_course(course)
+                kinds.append(kind)
+                groups.append(group)
+                positions.append(pos)
+                codes.append(course.code)
+                titles.append(course.title)
+
+    metadata = {'ge_analysis.snapshot_version': str(snapshot_version),
+                'ge_analysis.created': datetime.now(timezone.utc).isoformat(),
+                'ge_analysis.catalog': catalog or '',
+                'ge_analysis.groups': json.dumps({'area': list(ges),
+                                                  'badge': list(badges)})}
+    table = pa.table({'kind': pa.array(kinds).dictionary_encode(),
+                      'group': pa.array(groups, pa.string()).dictionary_encode(),
+                      'position': pa.array(positions, pa.int32()),
+                      'code': pa.array(codes, pa.string()),
+                      'title': pa.array(titles, pa.string())}).replace_schema_metadata(metadata)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def read_snapshot(path):
+    """Memory-map a snapshot and return its table and metadata
+
+    Input: string. Path of the snapshot
+    Output: tuple. pyarrow Table and a dict of the snapshot metadata
+    """
+
+    import pyarrow as pa
+
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    metadata = {key.decode(): value.decode()
+                for key, value in (table.schema.metadata or {}).items()}
+    version = int(metadata.get('ge_analysis.snapshot_version', 0))
+    if version != snapshot_version:
+        raise ValueError(f'{path} is snapshot version {version}; '
+                         f'expected version {snapshot_version}')
+
+    return table, metadata
+
+
+def load_snapshot(path):
+    """Load the GE and badge classes saved in a snapshot
+
+    Input: string. Path of the snapshot
+    Output: tuple. The GE dict (as from extract_ges) and the badge dict (as from
+        extract_badges)
+    """
+
+    table, metadata = read_snapshot(path)
+    order = json.loads(metadata['ge_analysis.groups'])
+    result = {'area': {group: [] for group in order['area']},
+              'badge': {group: [] for group in order['badge']}}
+
+    columns = [table.column(name).to_pylist()
+               for name in ('kind', 'group', 'code', 'title')]
+    for kind, group, code, title in zip(*columns):
+        result[kind][group].append(parse_course(f'{code}: {title}'))
+
+    return result['area'], result['badge']
+
+
+def load_sheets(path):
+    """Load a snapshot and rebuild every table of the workbook as DataFrames
+
+    Input: string. Path of the snapshot
+    Output: dict. Sheet names as keys and pandas dataframes as values
+    """
+
+    import scrape
+
+    ges, badges = load_snapshot(path)
+
+    return {sheet: scrape.create_dfs(table)
+            for sheet, table in scrape.cross_reference(ges, badges).items()}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Summarize a catalog snapshot.')
+    parser.add_argument('snapshot')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    import pyarrow      # noqa: F401 (timed separately from loading the snapshot)
+    imported = time.perf_counter()
+    ges, badges = load_snapshot(args.snapshot)
+    loaded = time.perf_counter()
+
+    metadata = read_snapshot(args.snapshot)[1]
+    print(f"Snapshot {args.snapshot} (version {metadata['ge_analysis.snapshot_version']}, "
+          f"created {metadata['ge_analysis.created']})")
+    print(f'Loaded in {(loaded - imported) * 1000:.1f} ms '
+          f'(+ {(imported - start) * 1000:.0f} ms to import pyarrow)')
+    for kind, groups in (('GE area', ges), ('Badge', badges)):
+        for group, courses in groups.items():
+            print(f'  {kind}: {group} ({len(courses)} courses)')
@@ -0,0 +1,402 @@
+'''
+Synthetic catalogs for scale testing.
+
+Generates catalog program pages and badge pages in exactly the layouts extract_ges and
+extract_badges read (see data/fixtures for the real-sized catalog), with any number of
+courses, GE areas, badges and catalog years:
+
+  - the GE courses of an area are listed in alphabetical order of their departments;
+    every area starts with a course of a department beginning with 'A' and ends with
+    one of a later letter, which no catalog year drops, so that ges_from_text finds
+    each break between areas;
+  - every badge lists a share of the GE courses (the overlap density) plus courses of
+    departments offering no GE course, such as the STEM departments;
+  - course titles get the noise of the real pages ('/a', non-breaking spaces, tabs);
+  - every further catalog year drops, adds and renames a share of the courses;
+  - optionally, any number of program pages list a few dozen of the GE and badge
+    courses each, and a catalog page links to all of them (see scrape.py --programs).
+
+The pages are published under the real URLs, so the scraper runs on them unchanged
+when they are written to a page archive:
+
+    python src/synth.py data/synthetic.warc.gz --courses 20000 --areas 200 --badges 100
+    python src/scrape.py --replay data/synthetic.warc.gz
+
+or, written to a directory with a manifest, measured stage by stage:
+
+    python src/synth.py /tmp/synthetic --courses 20000 --areas 200 --badges 100
+    python src/bench.py suite --fixtures /tmp/synthetic --baseline /tmp/synthetic/baseline.json
+'''
+
+
+import argparse
+import json
+import os
+import random
+import string
+
+from archive import ArchiveWriter
+import scrape
+
+
+_WORDS = ('Introduction Topics Studies Culture Society History Theory Methods Analysis '
+          'Global Media Art Language Literature Power Politics Identity Environment '
+          'Health Ethics Economics Cities Movement Film Music Writing Thought Science '
+          'Technology Change Community Justice Migration Religion Nature Design Data '
+          'Reasoning Practice Performance Visual Public Policy Law Memory Water Energy'
+          ).split()
+
+# Departments offering no GE course that badges may list anyway
+stem_departments = [dept for _, depts in scrape.department_groups.values() for dept in depts]
+
+
+def departments(count, rng):
+    """Draw distinct department codes
+
+    Input:  int. Number of departments
+            random.Random. Source of randomness
+    Output: list. Sorted department codes of 2 to 5 capital letters
+    """
+
+    depts = set()
+    while len(depts) < count:
+        depts.add(''.join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 5))))
+
+    return sorted(depts)
+
+
+def _title(rng, noise):
+    words = rng.sample(_WORDS, rng.randint(2, 5))
+    if rng.random() < noise:
+        words[0] += '/a'
+    title = ' '.join(words)
+    if rng.random() < noise:
+        title = title.replace(' ', '\xa0', 1)
+
+    return title
+
+
+def make_catalog(courses=500, areas=2, badges=11, years=('2020',), overlap=0.15,
+                 noise=0.05, churn=0.05, seed=0):
+    """Draw the GE areas and badges of a synthetic catalog
+
+    Input:  int. Number of GE courses in the first catalog year
+            int. Number of GE areas
+            int. Number of badges
+            list. Catalog years
+            float. Share of the GE courses a badge lists, on average
+            float. Share of course titles with noise characters
+            float. Share of the courses dropped, added and renamed every year
+            int. Seed of the random generator
+    Output: tuple. {year: {area: [course listings]}} and {badge: [course listings]};
+        the badges list courses of the last year
+    """
+
+    rng = random.Random(seed)
+
+    # Every area gets its own departments, one of them starting with 'A'
+    per_area = max(2, courses // areas // 12)
+    pool = [dept for dept in departments(per_area * areas * 2, rng) if dept[0] != 'A']
+    a_depts = [dept for dept in departments(areas * 3, rng) if dept[0] == 'A'] or ['AA']
+    area_depts = []
+    for idx in range(areas):
+        depts = rng.sample(pool, per_area - 1) + [a_depts[idx % len(a_depts)]]
+        area_depts.append(sorted(set(depts)))
+
+    def draw(depts, count):
+        listed = set()
+        while len(listed) < count:
+            listed.add((rng.choice(depts), f'{rng.randint(1, 199):03d}'))
+        return {course: _title(rng, noise) for course in sorted(listed)}
+
+    area_names = [f'Area {idx + 1:0{len(str(areas))}d} Courses' for idx in range(areas)]
+    ge = {name: draw(depts, max(1, courses // areas))
+          for name, depts in zip(area_names, area_depts)}
+
+    # The first and the last course of every area, kept in every year: one of its 'A'
+    # department and one of its last department, which begins with a later letter
+    anchors = set()
+    for name, depts in zip(area_names, area_depts):
+        for dept in (depts[0], depts[-1]):
+            course = (dept, f'{rng.randint(1, 199):03d}')
+            ge[name].setdefault(course, _title(rng, noise))
+            anchors.add(course)
+
+    history = {}
+    for idx, year in enumerate(years):
+        # Every year after the first drops, adds and renames a share of the courses of
+        # every area
+        for name, depts in zip(area_names, area_depts if idx else ()):
+            listed = ge[name]
+            kept = sorted(set(listed) - anchors)
+            for course in rng.sample(kept, min(int(len(listed) * churn), len(kept))):
+                del listed[course]
+            for course, title in draw(depts, int(len(listed) * churn) + 1).items():
+                listed.setdefault(course, title)
+            for course in rng.sample(sorted(listed), int(len(listed) * churn)):
+                listed[course] = _title(rng, noise)
+        history[year] = {name: [f'{dept} {number}: {title}'
+                                for (dept, number), title in sorted(listed.items())]
+                         for name, listed in ge.items()}
+
+    ge_courses = [f'{dept} {number}: {title}'
+                  for listed in ge.values() for (dept, number), title in listed.items()]
+    stem = [f'{dept} {rng.randint(1, 199):03d}: {_title(rng, noise)}'
+            for dept in stem_departments for _ in range(3)]
+    badge_classes = {}
+    for idx in range(badges):
+        count = max(1, int(len(ge_courses) * overlap * rng.uniform(0.5, 1.5)))
+        badge_classes[f'Synthetic Badge {idx + 1}'] = (
+            rng.sample(ge_courses, min(count, len(ge_courses)))
+            + rng.sample(stem, rng.randint(0, min(10, len(stem)))))
+
+    return history, badge_classes
+
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('\xa0', '&nbsp;')
+
+
+def catalog_page(areas, catoid=17, title='General Education Requirements'):
+    """Render GE areas as an acalog program preview page
+
+    Input:  dict. GE areas (or sections of a program) as keys and lists of course
+                listings as values
+            int. Catalog id used in the course links
+            string. Title of the program
+    Output: bytes. HTML page
+    """
+
+    blocks = []
+    for idx, (area, listings) in enumerate(areas.items()):
+        items = '\n'.join(
+            f'<li class="acalog-course"><span><a href="#" onclick="showCourse('
+            f'\'{catoid}\', \'{idx}\', this); return false;">{_escape(listing)}</a></span></li>'
+            for listing in listings)
+        blocks.append(f'<div class="acalog-core"><h2><a name="area{idx}"></a>'
+                      f'{_escape(area)}</h2>\n<ul class="program-list">\n{items}\n</ul></div>')
+    blocks.append('<div class="acalog-core"><p>Courses listed above satisfy the General '
+                  'Education requirement.</p></div>')
+
+    return ('<!DOCTYPE html>\n<html lang="en"><head><title>General Education</title></head>'
+            '\n<body><td class="block_content" colspan="2">\n'
+            f'<h1 id="acalog-content">{_escape(title)}</h1>\n'
+            + '\n'.join(blocks) + '\n</td></body></html>\n').encode('utf-8')
+
+
+def programs_url(catoid):
+    """URL of the synthetic catalog page listing every program
+
+    Input: int. Catalog id
+    Output: string. URL
+    """
+
+    return f'https://catalog.ucmerced.edu/content.php?catoid={catoid}&navoid=1'
+
+
+def programs_page(links, catoid):
+    """Render the catalog page linking to every program page
+
+    Input:  dict. Program titles as keys and program page URLs as values
+            int. Catalog id
+    Output: bytes. HTML page
+    """
+
+    items = '\n'.join(f'<li><a href="{url.replace("&", "&amp;")}">{_escape(title)}</a></li>'
+                      for title, url in links.items())
+
+    return ('<!DOCTYPE html>\n<html><head><title>Programs</title></head><body>\n'
+            '<h1 id="acalog-content">Programs</h1>\n'
+            f'<a href="content.php?catoid={catoid}&amp;navoid=1#top">Top</a>\n'
+            f'<a name="list"></a><ul class="program-list">{items}</ul>\n'
+            '<a href="mailto:catalog@ucmerced.edu">Contact</a>\n</body></html>\n').encode('utf-8')
+
+
+def make_programs(count, listings, rng):
+    """Draw the courses of synthetic programs
+
+    Input:  int. Number of programs
+            list. Course listings to draw from
+            random.Random. Source of randomness
+    Output: dict. Program titles as keys and {section: [course listings]} as values
+    """
+
+    programs = {}
+    for idx in range(count):
+        drawn = rng.sample(listings, min(len(listings), rng.randint(10, 40)))
+        split = len(drawn) // 2
+        programs[f'Program {idx + 1:0{len(str(count))}d}, B.S.'] = {
+            'Lower Division Requirements': sorted(drawn[:split]),
+            'Upper Division Requirements': sorted(drawn[split:])}
+
+    return programs
+
+
+def badge_index_page(links):
+    """Render the page linking to every badge page
+
+    Input: dict. Badge titles as keys and badge page URLs as values
+    Output: bytes. HTML page
+    """
+
+    items = '\n'.join(f'<li><a href="{url}">{_escape(title)}</a></li>'
+                      for title, url in links.items())
+
+    return ('<!DOCTYPE html>\n<html><head><title>Intellectual Experience Badges</title>'
+            '</head><body>\n<div id="content"><h1 class="title">Intellectual Experience '
+            f'Badges</h1>\n<ul>{items}</ul></div>\n</body></html>\n').encode('utf-8')
+
+
+def badge_page(title, listings, rng):
+    """Render a badge as a Drupal badge page
+
+    Input:  string. Badge title
+            list. Course listings
+            random.Random. Source of randomness for the line endings
+    Output: bytes. HTML page
+    """
+
+    lines = ''.join(f"{_escape(listing)}{rng.choice(['', '', chr(9), '&nbsp;'])}<br />\n"
+                    for listing in listings)
+
+    return ('<!DOCTYPE html>\n<html><head><title>Badge</title></head><body>\n'
+            f'<div id="page"><h1 class="title">\n  Badge: {_escape(title)}</h1>\n'
+            '<div id="content-col2-1"><div class="field field-name-body"><p><strong>'
+            f'Courses</strong><br />\n{lines}</p></div></div>\n'
+            '<div id="content-col2-2"><p>Related: see the other badges.</p></div></div>\n'
+            '</body></html>\n').encode('utf-8')
+
+
+def catalog_ids(years):
+    """Pick the (catoid, poid) of every catalog year: the real ones for the years in
+    scrape.catalogs, made-up ones for the others
+
+    Input: list. Catalog years
+    Output: dict. Catalog years as keys and (catoid, poid) as values
+    """
+
+    return {year: scrape.catalogs.get(year, (900 + idx, 9000 + idx))
+            for idx, year in enumerate(years)}
+
+
+def make_pages(history, badge_classes, seed=0, programs=0):
+    """Render a synthetic catalog as pages under the URLs the scraper fetches
+
+    Input:  dict. {year: {area: [course listings]}}, from make_catalog
+            dict. {badge: [course listings]}, from make_catalog
+            int. Seed of the random generator
+            int. Number of program pages of the last catalog year
+    Output: dict. URLs as keys and pages (bytes) as values
+    """
+
+    rng = random.Random(seed)
+    ids = catalog_ids(history)
+    pages = {scrape.catalog_url(*ids[year]): catalog_page(areas, ids[year][0])
+             for year, areas in history.items()}
+
+    links = {title: f"{scrape.badge_url}/synthetic-badge-{idx + 1}"
+             for idx, title in enumerate(badge_classes)}
+    pages[scrape.badge_url] = badge_index_page(links)
+    for title, listings in badge_classes.items():
+        pages[links[title]] = badge_page(title, listings, rng)
+
+    if programs:
+        catoid = ids[list(history)[-1]][0]
+        listings = sorted({listing for areas in list(history.values())[-1:]
+                           for area in areas.values() for listing in area}
+                          | {listing for badge in badge_classes.values() for listing in badge})
+        drawn = make_programs(programs, listings, rng)
+        links = {title: scrape.catalog_url(catoid, 20000 + idx)
+                 for idx, title in enumerate(drawn)}
+        pages[programs_url(catoid)] = programs_page(links, catoid)
+        for title, sections in drawn.items():
+            pages[links[title]] = catalog_page(sections, catoid, title)
+
+    return pages
+
+
+def write_archive(pages, path):
+    """Write pages to a page archive, e.g. for scrape.py --replay
+
+    Input:  dict. URLs as keys and pages as values
+            string. Path of the archive
+    Output: string. Path of the archive
+    """
+
+    with ArchiveWriter(path) as writer:
+        for url, page in pages.items():
+            writer.write(url, page)
+
+    return path
+
+
+def write_fixtures(pages, directory):
+    """Write pages to a directory with a manifest.json mapping URLs to files, the
+    layout of data/fixtures read by bench.py suite
+
+    Input:  dict. URLs as keys and pages as values
+            string. Directory
+    Output: string. Path of the manifest
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = {}
+    for idx, (url, page) in enumerate(pages.items()):
+        name = manifest[url] = f'page-{idx:05d}.html'
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(page)
+
+    path = os.path.join(directory, 'manifest.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    return path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic catalog in the layouts of the catalog and '
+                    'badge pages.')
+    parser.add_argument('output',
+                        help='page archive (*.warc.gz) or directory of fixtures to write')
+    parser.add_argument('--courses', type=int, default=500,
+                        help='number of GE courses')
+    parser.add_argument('--areas', type=int, default=2, help='number of GE areas')
+    parser.add_argument('--badges', type=int, default=11, help='number of badges')
+    parser.add_argument('--years', default='2020',
+                        help='comma separated catalog years, e.g. 2018,2019,2020')
+    parser.add_argument('--overlap', type=float, default=0.15,
+                        help='share of the GE courses listed by a badge, on average')
+    parser.add_argument('--noise', type=float, default=0.05,
+                        help="share of course titles with noise characters ('/a', "
+                             "non-breaking spaces)")
+    parser.add_argument('--churn', type=float, default=0.05,
+                        help='share of the courses dropped, added and renamed every year')
+    parser.add_argument('--programs', type=int, default=0,
+                        help='number of program pages of the last catalog year')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    years = args.years.replace(' ', '').split(',')
+    history, badge_classes = make_catalog(args.courses, args.areas, args.badges, years,
+                                          args.overlap, args.noise, args.churn, args.seed)
+    pages = make_pages(history, badge_classes, args.seed, args.programs)
+
+    size = sum(map(len, pages.values()))
+    print(f'{len(pages)} pages ({size / 2**20:.1f} MiB): {len(years)} catalog years, '
+          f'{args.areas} GE areas, {args.badges} badges')
+
+    if args.output.endswith('.warc.gz'):
+        write_archive(pages, args.output)
+        selected = [f'--catalog {year}={catoid}:{poid}' if year not in scrape.catalogs
+                    else f'--year {year}'
+                    for year, (catoid, poid) in catalog_ids(years).items()]
+        if args.programs:
+            selected.append(f'--programs {programs_url(catalog_ids(years)[years[-1]][0])}')
+        print(f"Scrape it with: python src/scrape.py --replay {args.output} "
+              f"{' '.join(selected)}")
+    else:
+        write_fixtures(pages, args.output)
+        print(f'Measure it with: python src/bench.py suite --fixtures {args.output} '
+              f'--baseline {os.path.join(args.output, "baseline.json")}')
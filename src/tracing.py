@@ -0,0 +1,336 @@
+'''
+Stage timing and fetch instrumentation.
+
+While a Tracer is active (see start()), the scraper records:
+
+  - every fetch: URL, status, bytes, latency and where the page came from (the
+    network, a fresh cache entry, a cache entry revalidated with a 304, a stale cache
+    entry served because the network failed, or an archive), plus every failed
+    attempt that was retried;
+  - a span for every page parsed (BeautifulSoup or the fast-path scanner), every
+    pipeline stage and the steps inside the cross-reference and export stages, with
+    its wall and CPU time and, when memory tracing is on, its allocation peak. The
+    spans recorded while a page is extracted (see page()) carry the URL or key of
+    that page, so the parse time can be broken down per page.
+
+The trace is saved as JSON that can be diffed across runs, or in the Chrome trace
+event format (chrome://tracing, Perfetto). When no tracer is active the hooks cost a
+single check.
+
+    python src/scrape.py --trace data/trace.json --chrome-trace data/trace.chrome.json
+    python src/scrape.py --profile
+'''
+
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+trace_version = 1
+
+# Tracer recording the current run, or None
+tracer = None
+
+# Page being extracted on each thread, see page()
+_current = threading.local()
+
+
+class Tracer:
+    """Collects the spans and fetches of a run
+
+    Input: bool. Also record the allocation peak of every span (slower)
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.started = datetime.now(timezone.utc).isoformat()
+        self.origin = time.perf_counter()
+        self.spans, self.fetches = [], []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def add_fetch(self, record):
+        with self._lock:
+            self.fetches.append(record)
+
+    def add_span(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def summary(self):
+        """Totals of the run
+
+        Input: None
+        Output: dict. Wall time of the run, fetch totals by source, the time of every
+            span category and the parse time of every page
+        """
+
+        sources = {}
+        for record in self.fetches:
+            totals = sources.setdefault(record['source'], {'count': 0, 'bytes': 0,
+                                                           'latency': 0.0})
+            totals['count'] += 1
+            totals['bytes'] += record['bytes']
+            totals['latency'] += record['latency']
+
+        categories, pages = {}, {}
+        for record in self.spans:
+            totals = categories.setdefault(record['cat'], {'count': 0, 'wall': 0.0,
+                                                           'cpu': 0.0})
+            totals['count'] += 1
+            totals['wall'] += record['wall']
+            totals['cpu'] += record['cpu']
+            if record['cat'] == 'parse' and 'page' in record:
+                pages[record['page']] = pages.get(record['page'], 0.0) + record['wall']
+
+        return {'wall': time.perf_counter() - self.origin, 'fetches': sources,
+                'spans': categories, 'pages': pages}
+
+    def to_json(self):
+        """The trace as a JSON-serializable dict
+
+        Input: None
+        Output: dict
+        """
+
+        return {'version': trace_version, 'started': self.started, 'argv': sys.argv,
+                'memory': self.memory, 'summary': self.summary(),
+                'spans': sorted(self.spans, key=lambda record: record['start']),
+                'fetches': sorted(self.fetches, key=lambda record: record['start'])}
+
+    def to_chrome(self):
+        """The trace in the Chrome trace event format
+
+        Input: None
+        Output: dict
+        """
+
+        pid = os.getpid()
+        events = [{'name': record['name'], 'cat': record['cat'], 'ph': 'X',
+                   'ts': record['start'] * 1e6, 'dur': record['wall'] * 1e6,
+                   'pid': pid, 'tid': record['thread'],
+                   'args': {key: value for key, value in record.items()
+                            if key not in ('name', 'cat', 'start', 'wall', 'thread')}}
+                  for record in self.spans]
+        events += [{'name': record['url'], 'cat': 'fetch', 'ph': 'X',
+                    'ts': record['start'] * 1e6, 'dur': record['latency'] * 1e6,
+                    'pid': pid, 'tid': record['thread'],
+                    'args': {'status': record['status'], 'bytes': record['bytes'],
+                             'source': record['source']}}
+                   for record in self.fetches]
+
+        return {'traceEvents': sorted(events, key=lambda event: event['ts']),
+                'displayTimeUnit': 'ms'}
+
+
+def start(memory=False):
+    """Start recording a trace
+
+    Input: bool. Also record allocation peaks, see Tracer
+    Output: Tracer
+    """
+
+    global tracer
+
+    tracer = Tracer(memory)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    return tracer
+
+
+def stop():
+    """Stop recording
+
+    Input: None
+    Output: Tracer. The tracer that was recording, or None
+    """
+
+    global tracer
+
+    stopped, tracer = tracer, None
+    if stopped is not None and stopped.memory:
+        tracemalloc.stop()
+
+    return stopped
+
+
+@contextmanager
+def span(name, cat='step', **args):
+    """Record the time (and allocation peak) of a block of code
+
+    Input:  string. Name of the span, e.g. the stage name
+            string. Category, e.g. 'stage', 'parse' or 'step'
+            Extra fields stored with the span
+    Output: context manager yielding the dict of extra fields, which the block may
+        update
+    """
+
+    active = tracer
+    if active is None:
+        yield args
+        return
+
+    if getattr(_current, 'page', None) is not None:
+        args.setdefault('page', _current.page)
+    memory = active.memory and tracemalloc.is_tracing()
+    stack = active._stack()
+    if memory:
+        # tracemalloc has a single peak: restart it for this span and hand the peak
+        # reached inside it over to the enclosing span when done
+        outer_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    frame = {'peak': 0}
+    stack.append(frame)
+
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield args
+    finally:
+        wall = time.perf_counter() - start_wall
+        cpu = time.process_time() - start_cpu
+        stack.pop()
+        record = {'name': name, 'cat': cat, 'start': start_wall - active.origin,
+                  'wall': wall, 'cpu': cpu, 'thread': threading.get_ident(), **args}
+        if memory:
+            peak = max(tracemalloc.get_traced_memory()[1], frame['peak'])
+            record['peak_bytes'] = peak - baseline
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak, outer_peak)
+        active.add_span(record)
+
+
+@contextmanager
+def page(key):
+    """Attribute the spans recorded inside a block to a page
+
+    Input: string. URL of the page, or another key identifying it; None for no page
+    Output: context manager
+    """
+
+    outer = getattr(_current, 'page', None)
+    _current.page = key
+    try:
+        yield
+    finally:
+        _current.page = outer
+
+
+def traced(cat, name=None):
+    """Decorate a function so that every call is recorded as a span
+
+    Input:  string. Category of the spans
+            string. Name of the spans (defaults to the function name)
+    Output: decorator
+    """
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if tracer is None:
+                return func(*args, **kwargs)
+            with span(name or func.__name__, cat):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def fetched(url, status, size, started, source):
+    """Record a fetch
+
+    Input:  string. URL
+            int. HTTP status (200 for pages from a cache or an archive)
+            int. Number of bytes of the page
+            float. time.perf_counter() when the fetch started
+            string. 'network', 'cache', 'revalidated', 'stale', 'replay' or 'retry'
+                (a failed attempt)
+    Output: None
+    """
+
+    active = tracer
+    if active is None:
+        return
+
+    active.add_fetch({'url': url, 'status': status, 'bytes': size,
+                      'latency': time.perf_counter() - started,
+                      'start': started - active.origin, 'source': source,
+                      'thread': threading.get_ident()})
+
+
+def write_trace(a_tracer, path):
+    """Save a trace as JSON
+
+    Input:  Tracer
+            string. Path of the trace
+    Output: string. Path of the trace
+    """
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(a_tracer.to_json(), f, indent=1)
+
+    return path
+
+
+def write_chrome_trace(a_tracer, path):
+    """Save a trace in the Chrome trace event format
+
+    Input:  Tracer
+            string. Path of the trace
+    Output: string. Path of the trace
+    """
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(a_tracer.to_chrome(), f)
+
+    return path
+
+
+def report(a_tracer, out=sys.stdout):
+    """Print where the time of a run went: fetches by source, and every stage and step
+    with its wall and CPU time and allocation peak
+
+    Input:  Tracer
+            file. Where to print
+    Output: None
+    """
+
+    summary = a_tracer.summary()
+    print(f"Run: {summary['wall'] * 1000:.0f} ms", file=out)
+    for source, totals in summary['fetches'].items():
+        print(f"  fetch {source:<12} {totals['count']:>5} pages "
+              f"{totals['bytes'] / 1024:>9.0f} KiB {totals['latency'] * 1000:>9.0f} ms "
+              f"(summed over threads)", file=out)
+    parse = summary['spans'].get('parse')
+    if parse:
+        print(f"  parse {parse['count']:>18} pages {parse['wall'] * 1000:>23.0f} ms",
+              file=out)
+    slowest = sorted(summary['pages'].items(), key=lambda item: -item[1])[:5]
+    for key, wall in slowest:
+        print(f"    {wall * 1000:>8.1f} ms  {key}", file=out)
+
+    print(f'  {"span":<36} {"wall (ms)":>10} {"cpu (ms)":>10} {"peak (KiB)":>11}', file=out)
+    for record in sorted(a_tracer.spans, key=lambda record: record['start']):
+        if record['cat'] == 'parse':
+            continue
+        peak = f"{record['peak_bytes'] / 1024:>11.0f}" if 'peak_bytes' in record else ''
+        label = f"{record['cat']}:{record['name']}"
+        if 'sheet' in record:
+            label += f" {record['sheet']}"
+        if record.get('reused'):
+            label += ' (reused)'
+        print(f"  {label[:36]:<36} {record['wall'] * 1000:>10.1f} "
+              f"{record['cpu'] * 1000:>10.1f} {peak}", file=out)